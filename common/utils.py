@@ -5,9 +5,21 @@ from logging.handlers import RotatingFileHandler
 import gzip
 import logging
 import os
+import redis
 
 logger = logging.getLogger('django')
 DATA_DIR       = settings.DATA_DIR
+_redis_client  = None
+
+# -------------------------
+#       Redis
+# -------------------------
+def get_redis():
+    # One client (and connection pool) per process
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
 
 
 # -------------------------
@@ -30,16 +30,73 @@ CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_TASK_SOFT_TIME_LIMIT               = 1600  # 10 minutes soft time limit
 CELERY_TASK_TIME_LIMIT                    = 1200  # 20 minutes hard time limit
 CELERY_TASK_RESULT_EXPIRES                = timedelta(minutes=15)
+# One queue per kind of work, so slow browser checks never hold up the HTTP checks (superstart.py runs a worker per queue)
+CELERY_TASK_DEFAULT_QUEUE                 = 'maintenance'
+CELERY_TASK_ROUTES                        = {
+    'monitor.tasks.run_http_actions'     : {'queue': 'http'},
+    'monitor.tasks.run_playwright_action': {'queue': 'browser'},
+    'monitor.tasks.send_notifications'   : {'queue': 'notify'},
+    'monitor.tasks.refresh_favicon'      : {'queue': 'http'},   # network bound, keeps slow sites off the maintenance queue
+    'monitor.tasks.*'                    : {'queue': 'maintenance'},
+}
+SCHEDULER_BATCH_SIZE                      = config('SCHEDULER_BATCH_SIZE', default=5000, cast=int)  # Max actions claimed per UPDATE
+SCHEDULER_MODE                            = config('SCHEDULER_MODE', default='daemon')  # 'daemon' (run_scheduler) or 'beat' (30 s poll)
+SCHEDULER_CHANNEL                         = 'djanguard:scheduler'
+SCHEDULER_MAX_SLEEP                       = 1.0   # seconds, upper bound on dispatch latency
+SCHEDULER_RESYNC_INTERVAL                 = 300   # seconds between full rebuilds of the in-memory schedule
+SCHEDULER_SHARDS                          = config('SCHEDULER_SHARDS', default=16, cast=int)  # action id % shards, split between scheduler nodes
+SCHEDULER_LEASE_SECONDS                   = config('SCHEDULER_LEASE_SECONDS', default=30, cast=int)  # a dead node's shards move within one lease
+SCHEDULER_BEAT_INTERVAL                   = 30    # seconds between two beat polls when SCHEDULER_MODE is 'beat'
+SCHEDULER_DISPATCH_RATE                   = config('SCHEDULER_DISPATCH_RATE', default=0, cast=float)  # checks queued per second, 0 = unlimited
+SCHEDULER_DISPATCH_BURST                  = config('SCHEDULER_DISPATCH_BURST', default=50, cast=int)
+HTTP_BATCH_SIZE                           = config('HTTP_BATCH_SIZE', default=50, cast=int)  # HTTP checks per run_http_actions task
+HTTP_BATCH_CONCURRENCY                    = config('HTTP_BATCH_CONCURRENCY', default=20, cast=int)  # concurrent requests inside one batch
+HTTP_CHECK_TIMEOUT                        = config('HTTP_CHECK_TIMEOUT', default=30, cast=int)  # seconds one HTTP check may take, capped at the sensor frequency
+HTTP_POOL_LIMIT                           = config('HTTP_POOL_LIMIT', default=100, cast=int)  # open connections per worker process
+HTTP_POOL_LIMIT_PER_HOST                  = config('HTTP_POOL_LIMIT_PER_HOST', default=10, cast=int)
+HTTP_KEEPALIVE_TIMEOUT                    = 30    # seconds an idle pooled connection is kept open
+HTTP_DNS_CACHE_TTL                        = 300   # seconds a resolved host is cached
+HTTP_CHECK_MAX_BYTES                      = config('HTTP_CHECK_MAX_BYTES', default=5 * 1024 * 1024, cast=int)  # body bytes scanned by contains_keyword at most
+HTTP_CHUNK_SIZE                           = 64 * 1024
+HTTP_DRAIN_MAX_BYTES                      = 64 * 1024  # status_code checks: bodies up to this size are drained to keep the connection
+BROWSER_WAIT_TIMEOUT                      = config('BROWSER_WAIT_TIMEOUT', default=10000, cast=int)  # ms a browser check waits for a condition unless the action sets wait_timeout
+BROWSER_SESSION_TTL                       = timedelta(seconds=config('BROWSER_SESSION_TTL', default=3600, cast=int))  # how long a saved login session is reused
+BROWSER_MAX_USES                          = config('BROWSER_MAX_USES', default=200, cast=int)  # checks served by one browser before it is replaced
+BROWSER_MAX_RSS_MB                        = config('BROWSER_MAX_RSS_MB', default=1024, cast=int)  # browser process tree memory that triggers a replacement
+BROWSER_TRACE                             = config('BROWSER_TRACE', default=True, cast=bool)  # record a Playwright trace of selenium checks, kept when they fail
+BROWSER_TRACE_KEEP                        = config('BROWSER_TRACE_KEEP', default=5, cast=int)  # failure traces kept per action, oldest deleted first
+SCREENSHOT_FORMAT                         = config('SCREENSHOT_FORMAT', default='webp')  # webp or jpeg
+SCREENSHOT_SIZE                           = config('SCREENSHOT_SIZE', default=500, cast=int)  # px, longest side of a stored screenshot
+SCREENSHOT_QUALITY                        = config('SCREENSHOT_QUALITY', default=50, cast=int)
+SCREENSHOT_WORKERS                        = 2     # threads encoding screenshots per worker process
+SCREENSHOT_DIFF_TOLERANCE                 = 32    # gray levels (0-255) a thumbnail pixel may move before it counts as changed
+SCREENSHOT_RETENTION                      = timedelta(days=config('SCREENSHOT_RETENTION_DAYS', default=30, cast=int))  # the latest screenshot of an action is always kept
+CHECK_PLAN_CACHE_SIZE                     = 10000  # compiled check plans kept per worker process
+DSL_CACHE_SIZE                            = 1000   # compiled DSL scripts kept per worker process, by script hash
+FAVICON_TTL                               = timedelta(days=1)  # how long a resolved favicon is trusted
+FAVICON_TIMEOUT                           = 10    # seconds the favicon lookup of a sensor may take
+INFLIGHT_TTL                              = CELERY_TASK_TIME_LIMIT  # seconds a queued or running check blocks new dispatches of its action
+REDIS_URL                                 = config('REDIS_URL', default=CELERY_BROKER_URL)
 CELERY_BEAT_SCHEDULE = {
-    'check-sensors-periodically': {
-        'task': 'monitor.tasks.schedule_sensor_actions',
-        'schedule': timedelta(seconds=30),  # Run every 10 seconds
-    },
     'delete-old-task-results-every-hour': {
         'task': 'monitor.tasks.delete_old_task_results',
         'schedule': timedelta(seconds=60),  # This runs every hour at the start of the hour
     },    
+    'refresh-stale-favicons': {
+        'task': 'monitor.tasks.refresh_stale_favicons',
+        'schedule': timedelta(hours=1),
+    },
+    'prune-screenshots': {
+        'task': 'monitor.tasks.prune_screenshots',
+        'schedule': timedelta(days=1),
+    },
 }
+if SCHEDULER_MODE == 'beat':
+    # Without the scheduler daemon, poll for due actions
+    CELERY_BEAT_SCHEDULE['check-sensors-periodically'] = {
+        'task': 'monitor.tasks.schedule_sensor_actions',
+        'schedule': timedelta(seconds=SCHEDULER_BEAT_INTERVAL),
+    }
 
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Sensor, Action, TestResult, UserProfile
+from .models import Sensor, Action, TestResult, UserProfile, SchedulerLease, Screenshot, PageMetric
 
 # Customize Admin site settings
 admin.site.site_header = "Djanguard Administration"
@@ -16,13 +16,19 @@ class SensorAdmin(admin.ModelAdmin):
 @admin.register(Action)
 class ActionAdmin(admin.ModelAdmin):
     search_fields = ['action_name', 'action_type', 'sensor__name']
-    list_display  = ['id', 'action_name', 'action_type', 'action_path', 'last_execution', 'sensor', 'assertion_type', 'expected_value', 'sequence']
+    list_display  = ['id', 'action_name', 'action_type', 'action_path', 'last_execution', 'next_run_at', 'sensor', 'assertion_type', 'expected_value', 'sequence']
+
+# Browser metrics of every page a TestResult loaded
+class PageMetricInline(admin.TabularInline):
+    model = PageMetric
+    extra = 0
 
 # Custom Admin for TestResult Model
 @admin.register(TestResult)
 class TestResultAdmin(admin.ModelAdmin):
     search_fields = ['action__action_name', 'test_type', 'expected_value', 'actual_value']
-    list_display  = ['id', 'action', 'test_type', 'expected_value', 'actual_value', 'timestamp']
+    list_display  = ['id', 'action', 'test_type', 'expected_value', 'actual_value', 'ttfb_ms', 'total_ms', 'timestamp']
+    inlines       = [PageMetricInline]
 
 # Custom Admin for UserProfile Model
 @admin.register(UserProfile)
@@ -30,3 +36,12 @@ class UserProfileAdmin(admin.ModelAdmin):
     search_fields = ['user']
     list_display = ['id', 'user', 'is_paying_user']
 
+# Custom Admin for SchedulerLease Model
+@admin.register(SchedulerLease)
+class SchedulerLeaseAdmin(admin.ModelAdmin):
+    list_display = ['shard', 'owner', 'expires_at']
+
+# Custom Admin for Screenshot Model
+@admin.register(Screenshot)
+class ScreenshotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'action', 'timestamp', 'digest', 'size']
@@ -0,0 +1,66 @@
+from fnmatch import fnmatch
+from urllib.parse import urlsplit
+
+TRACKER_DOMAINS = [
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'facebook.net', 'connect.facebook.com', 'hotjar.com', 'clarity.ms', 'segment.io', 'segment.com',
+    'mixpanel.com', 'amplitude.com', 'fullstory.com', 'newrelic.com', 'nr-data.net', 'matomo.cloud',
+]
+
+PRESETS = {
+    'assert_only': {'resource_types': ['image', 'media', 'font'], 'domains': TRACKER_DOMAINS},
+}
+
+class BlockPolicy:
+    """
+    Aborts the requests of a browser check that match a resource type (Playwright
+    `request.resource_type`: image, media, font, stylesheet, script, ...) or a domain.
+    A domain matches itself and its subdomains; patterns with `*` are matched with fnmatch.
+    The page document itself is never blocked.
+    """
+    def __init__(self, resource_types=(), domains=()):
+        self.resource_types = frozenset(resource_types)
+        self.domains        = frozenset(domain.lower() for domain in domains if '*' not in domain)
+        self.suffixes       = tuple('.' + domain for domain in self.domains)
+        self.patterns       = tuple(domain.lower() for domain in domains if '*' in domain)
+
+    def blocks(self, resource_type, url):
+        if resource_type == 'document':
+            return False
+        if resource_type in self.resource_types:
+            return True
+        host = (urlsplit(url).hostname or '').lower()
+        if host in self.domains or host.endswith(self.suffixes):
+            return True
+        return any(fnmatch(host, pattern) for pattern in self.patterns)
+
+    async def route(self, route):
+        request = route.request
+        if self.blocks(request.resource_type, request.url):
+            await route.abort('blockedbyclient')
+        else:
+            await route.continue_()
+
+def block_policy(action):
+    """BlockPolicy for the action, or None when nothing is blocked."""
+    if action.block_policy == 'custom':
+        rules = action.block_rules or {}
+    elif action.block_policy in PRESETS and action.assertion_type != 'screenshot':
+        # Presets are made for assertions; a screenshot only blocks what custom rules ask for
+        rules = PRESETS[action.block_policy]
+    else:
+        return None
+    if not rules.get('resource_types') and not rules.get('domains'):
+        return None
+    return BlockPolicy(rules.get('resource_types', ()), rules.get('domains', ()))
+
+def validate_block_rules(rules):
+    # {"resource_types": [...], "domains": [...]}, both optional
+    if rules in (None, ''):
+        return {}
+    if not isinstance(rules, dict) or set(rules) - {'resource_types', 'domains'}:
+        raise ValueError('Expected an object with "resource_types" and/or "domains" lists')
+    for key, values in rules.items():
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f'"{key}" must be a list of strings')
+    return rules
@@ -0,0 +1,111 @@
+from .http import get_loop
+from contextlib import asynccontextmanager
+from django.conf import settings
+from playwright.async_api import async_playwright
+
+import asyncio
+import logging
+import psutil
+
+logger = logging.getLogger('celery_process')
+
+class BrowserPool:
+    """
+    Worker-lifetime Chromium shared by every browser check of the process. Each check
+    gets its own BrowserContext (fresh cookies, storage and cache), which costs a few
+    ms instead of a browser launch. The browser is replaced after BROWSER_MAX_USES
+    contexts, when the process tree passes BROWSER_MAX_RSS_MB or when it is no longer
+    connected; a retired browser is closed once its last context is done.
+    """
+    def __init__(self):
+        self.playwright = None
+        self.browser    = None
+        self.uses       = 0
+        self.active     = {}   # browser -> open contexts
+        self.lock       = None
+
+    async def get_browser(self):
+        # Serialized, so concurrent checks never launch a browser each
+        self.lock = self.lock or asyncio.Lock()
+        async with self.lock:
+            return await self.launch()
+
+    async def launch(self):
+        if self.browser is not None and not self.browser.is_connected():
+            logger.warning('Browser disconnected, launching a new one')
+            self.active.pop(self.browser, None)
+            self.browser = None
+        elif self.browser is not None and self.uses >= settings.BROWSER_MAX_USES:
+            logger.info(f'Recycling browser after {self.uses} checks')
+            await self.retire(self.browser)
+        if self.browser is None:
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(headless=True)
+            self.uses    = 0
+            self.active[self.browser] = 0
+            logger.info('Browser launched')
+        return self.browser
+
+    def rss_mb(self):
+        # Chromium runs as children of the Playwright driver, itself a child of this worker
+        try:
+            processes = psutil.Process().children(recursive=True)
+            return sum(process.memory_info().rss for process in processes) / 1024 / 1024
+        except psutil.Error:
+            return 0
+
+    async def retire(self, browser):
+        if self.browser is browser:
+            self.browser = None
+        if not self.active.get(browser):
+            self.active.pop(browser, None)
+            try:
+                await browser.close()
+            except Exception as exc:
+                logger.error(f'Could not close browser: {exc}')
+
+    @asynccontextmanager
+    async def context(self, **options):
+        browser = await self.get_browser()
+        try:
+            context = await browser.new_context(**options)
+        except Exception:
+            # Failed health check: start over on a new browser once
+            await self.retire(browser)
+            browser = await self.get_browser()
+            context = await browser.new_context(**options)
+        self.uses            += 1
+        self.active[browser]  = self.active.get(browser, 0) + 1
+        try:
+            yield context
+        finally:
+            self.active[browser] -= 1
+            try:
+                await context.close()
+            except Exception as exc:
+                logger.error(f'Could not close browser context: {exc}')
+            if browser is self.browser and self.rss_mb() > settings.BROWSER_MAX_RSS_MB:
+                logger.info(f'Recycling browser at {self.rss_mb():.0f} MB')
+                await self.retire(browser)
+            elif browser is not self.browser:
+                await self.retire(browser)
+
+    async def close(self):
+        for browser in list(self.active):
+            self.active[browser] = 0
+            await self.retire(browser)
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+pool = BrowserPool()
+
+def browser_context(**options):
+    """Fresh, isolated BrowserContext from the worker's pooled browser, closed on exit."""
+    return pool.context(**options)
+
+def close_browser_pool():
+    if pool.playwright is not None:
+        get_loop().run_until_complete(pool.close())
+        logger.info('Browser pool closed')
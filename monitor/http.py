@@ -0,0 +1,194 @@
+from .jsonstream import JsonPathScanner
+from django.conf import settings
+
+import aiohttp
+import asyncio
+import logging
+import ssl
+import time
+
+logger   = logging.getLogger('celery_process')
+_loop    = None
+_session = None
+
+def get_loop():
+    # One event loop per worker process, so pooled connections outlive a single task
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+class RequestTimings:
+    """
+    Phase durations of one request in milliseconds, filled in by the timing trace of the
+    shared session when passed as `trace_request_ctx`. dns_ms and connect_ms stay None
+    when the phase was skipped (cached DNS entry, pooled connection). aiohttp does not
+    signal the TLS handshake on its own, so connect_ms covers TCP connect plus TLS.
+    """
+    def __init__(self):
+        self.started    = time.perf_counter()
+        self.dns_ms     = None
+        self.connect_ms = None
+        self.ttfb_ms    = None
+        self.total_ms   = None
+        self.marks      = {}
+
+    def elapsed(self, since=None):
+        return (time.perf_counter() - (since or self.started)) * 1000
+
+    def dns_start(self):
+        self.marks['dns'] = time.perf_counter()
+
+    def dns_end(self):
+        spent                = self.elapsed(self.marks['dns'])
+        self.dns_ms          = round((self.dns_ms or 0) + spent, 2)
+        self.marks['lookup'] = self.marks.get('lookup', 0) + spent
+
+    def connect_start(self):
+        self.marks['connect'] = time.perf_counter()
+        self.marks['lookup']  = 0
+
+    def connect_end(self):
+        # The lookup runs inside the connection span, keep it out of connect_ms
+        spent           = self.elapsed(self.marks['connect']) - self.marks['lookup']
+        self.connect_ms = round((self.connect_ms or 0) + spent, 2)
+
+    def headers_received(self):
+        self.ttfb_ms = round(self.elapsed(), 2)
+
+    def finish(self):
+        self.total_ms = round(self.elapsed(), 2)
+
+def timing_trace():
+    trace = aiohttp.TraceConfig()
+
+    def hook(method):
+        async def callback(session, ctx, params):
+            if isinstance(ctx.trace_request_ctx, RequestTimings):
+                getattr(ctx.trace_request_ctx, method)()
+        return callback
+
+    trace.on_dns_resolvehost_start.append(hook('dns_start'))
+    trace.on_dns_resolvehost_end.append(hook('dns_end'))
+    trace.on_connection_create_start.append(hook('connect_start'))
+    trace.on_connection_create_end.append(hook('connect_end'))
+    trace.on_request_end.append(hook('headers_received'))
+    return trace
+
+def get_session():
+    """
+    Worker-lifetime ClientSession shared by every check of the process.
+    Must be called from a coroutine running on get_loop().
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit             = settings.HTTP_POOL_LIMIT,
+            limit_per_host    = settings.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout = settings.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache     = settings.HTTP_DNS_CACHE_TTL,
+            ssl               = ssl.create_default_context(),  # one TLS context for every connection of the pool
+        )
+        _session = aiohttp.ClientSession(connector=connector, trace_configs=[timing_trace()])
+        logger.info('HTTP connection pool created')
+    return _session
+
+def check_timeout(frequency):
+    # HTTP_CHECK_TIMEOUT, but never longer than the sensor frequency (seconds)
+    return aiohttp.ClientTimeout(total=min(settings.HTTP_CHECK_TIMEOUT, max(frequency, 1)))
+
+async def stream_contains(response, keyword, max_bytes=None):
+    """
+    Look for `keyword` in the response body chunk by chunk, keeping only the last
+    len(keyword) - 1 bytes between chunks so matches across chunk borders are found.
+    Stops at the first match, and after `max_bytes` (HTTP_CHECK_MAX_BYTES) at most.
+    """
+    max_bytes = max_bytes or settings.HTTP_CHECK_MAX_BYTES
+    try:
+        needle = keyword.encode(response.charset or 'utf-8')
+    except (LookupError, UnicodeEncodeError):
+        needle = keyword.encode('utf-8')
+    overlap = len(needle) - 1
+    tail    = b''
+    read    = 0
+    async for chunk in response.content.iter_chunked(settings.HTTP_CHUNK_SIZE):
+        chunk  = chunk[:max_bytes - read]
+        read  += len(chunk)
+        window = tail + chunk
+        if needle in window:
+            return True
+        if read >= max_bytes:
+            logger.info(f'{response.url}: keyword not found in the first {read} bytes, giving up')
+            return False
+        tail = window[-overlap:] if overlap else b''
+    return False
+
+async def stream_json_path(response, path, max_bytes=None):
+    """
+    Tell whether the JSON body has a value at `path` (expression or jsonstream.parse_path steps), parsing
+    it while it streams in. Stops as soon as the value starts, and after `max_bytes`
+    (HTTP_CHECK_MAX_BYTES) at most. Raises ValueError on an invalid path or body.
+    """
+    max_bytes = max_bytes or settings.HTTP_CHECK_MAX_BYTES
+    scanner   = JsonPathScanner(path)
+    read      = 0
+    async for chunk in response.content.iter_chunked(settings.HTTP_CHUNK_SIZE):
+        chunk  = chunk[:max_bytes - read]
+        read  += len(chunk)
+        if scanner.feed(chunk):
+            return True
+        if read >= max_bytes:
+            logger.info(f'{response.url}: JSON path not found in the first {read} bytes, giving up')
+            return False
+    return scanner.close()
+
+async def read_body(response, max_bytes=None):
+    """
+    The response body, read to the end or to `max_bytes` (HTTP_CHECK_MAX_BYTES) at most.
+    content.read(n) would only return what is already buffered.
+    """
+    max_bytes = max_bytes or settings.HTTP_CHECK_MAX_BYTES
+    chunks    = []
+    read      = 0
+    async for chunk in response.content.iter_chunked(settings.HTTP_CHUNK_SIZE):
+        chunk  = chunk[:max_bytes - read]
+        read  += len(chunk)
+        chunks.append(chunk)
+        if read >= max_bytes:
+            logger.info(f'{response.url}: body cut at {read} bytes')
+            break
+    return b''.join(chunks)
+
+async def discard_body(response):
+    """
+    Done with a response once its headers are in. A small body with a known length is
+    read so the connection goes back to the pool; anything else (large, chunked) is
+    aborted instead of downloaded. HEAD, 204 and 304 responses have no body whatever
+    their Content-Length says.
+    """
+    if response.method == 'HEAD' or response.status in (204, 304):
+        response.release()
+    elif response.content_length is not None and response.content_length <= settings.HTTP_DRAIN_MAX_BYTES:
+        await response.read()
+        response.release()
+    else:
+        response.close()
+
+async def _open_session():
+    get_session()
+
+async def _close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def open_pool():
+    get_loop().run_until_complete(_open_session())
+
+def close_pool():
+    if _loop is not None and not _loop.is_closed():
+        _loop.run_until_complete(_close_session())
+        _loop.close()
+        logger.info('HTTP connection pool closed')
@@ -0,0 +1,28 @@
+from common.utils import get_redis
+from django.conf import settings
+
+INFLIGHT_KEY = 'djanguard:inflight:{}'
+
+# Delete the key only if it still holds our token, so a late run never frees a newer one
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def acquire(tokens):
+    """
+    Register the runs in `tokens` ({action id: task id}) as in flight, in one round trip.
+    Returns the action ids that are still running, whose dispatch must be skipped.
+    """
+    action_ids = list(tokens)
+    with get_redis().pipeline(transaction=False) as pipe:
+        for action_id in action_ids:
+            pipe.set(INFLIGHT_KEY.format(action_id), tokens[action_id], nx=True, ex=settings.INFLIGHT_TTL)
+        acquired = pipe.execute()
+    return [action_id for action_id, ok in zip(action_ids, acquired) if not ok]
+
+def release(action_id, token):
+    if token:
+        get_redis().eval(RELEASE_SCRIPT, 1, INFLIGHT_KEY.format(action_id), token)
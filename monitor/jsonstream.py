@@ -0,0 +1,202 @@
+import json
+import re
+
+# Step matching any object member or array item: `.*` / `[*]`
+WILDCARD = object()
+
+PATH_STEP   = re.compile(r"""\.(?P<name>[^.\[\]]+)|\[(?P<index>-?\d+)\]|\[(?P<quoted>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")\]|\[\*\]""")
+SCALAR      = re.compile(rb'[^\s,\]}]+')
+STRUCTURE   = re.compile(rb'["\[\]{}]')
+WHITESPACE  = b' \t\r\n'
+
+def parse_path(expression):
+    """
+    Parse a JSONPath-style expression into a list of steps: member names (str), array
+    indexes (int) or WILDCARD. Supports `$.data.items[0].id`, `$['a key'][*]`, `.*`;
+    the leading `$` is optional.
+    """
+    expression = expression.strip()
+    if expression.startswith('$'):
+        expression = expression[1:]
+    elif expression and expression[0] not in '.[':
+        expression = '.' + expression
+    steps, pos = [], 0
+    while pos < len(expression):
+        match = PATH_STEP.match(expression, pos)
+        if not match:
+            raise ValueError(f'Invalid JSON path at "{expression[pos:]}"')
+        if match.group('name') is not None:
+            steps.append(WILDCARD if match.group('name') == '*' else match.group('name'))
+        elif match.group('index') is not None:
+            if match.group('index').startswith('-'):
+                # Counting from the end needs the whole array, the scan stops before that
+                raise ValueError(f'Negative index not supported at "{expression[pos:]}"')
+            steps.append(int(match.group('index')))
+        elif match.group('quoted') is not None:
+            quoted = match.group('quoted')
+            steps.append(json.loads('"' + quoted[1:-1].replace('"', '\\"').replace("\\'", "'") + '"') if quoted[0] == "'" else json.loads(quoted))
+        else:
+            steps.append(WILDCARD)
+        pos = match.end()
+    return steps
+
+class JsonPathScanner:
+    """
+    Incremental JSON tokenizer telling whether a value exists at `path`.
+    Feed it the body chunk by chunk: feed() returns True as soon as a value starts at
+    the path, so the rest of the document is never read. Containers off the path are
+    skipped by bracket counting without being tokenized. Only the bytes of the token
+    being parsed are buffered, plus one frame per open object or array.
+    Raises ValueError on malformed JSON.
+    """
+    def __init__(self, path):
+        self.steps  = parse_path(path) if isinstance(path, str) else path
+        self.stack  = []     # [member name or array index, expected token] per open container
+        self.expect = 'value'
+        self.buffer = bytearray()
+        self.pos    = 0
+        self.scan   = None   # resume offset while inside a string split over chunks
+        self.skip   = 0      # nesting depth of the container being skipped
+        self.found  = False
+
+    def on_path(self):
+        return all(step is WILDCARD or step == frame[0] for step, frame in zip(self.steps, self.stack))
+
+    def matches(self):
+        return len(self.stack) == len(self.steps) and self.on_path()
+
+    def feed(self, chunk, final=False):
+        if self.found:
+            return True
+        self.buffer += chunk
+        try:
+            self.parse(final)
+        finally:
+            del self.buffer[:self.pos]
+            if self.scan is not None:
+                self.scan -= self.pos
+            self.pos = 0
+        return self.found
+
+    def close(self):
+        return self.feed(b'', final=True)
+
+    def error(self, message):
+        raise ValueError(f'Invalid JSON: {message} at byte {self.pos}')
+
+    def value_start(self):
+        if self.matches():
+            self.found = True
+
+    def value_end(self):
+        self.expect = 'comma' if self.stack else 'end'
+
+    def parse(self, final):
+        buffer = self.buffer
+        while not self.found:
+            if self.skip:
+                if not self.skip_container():
+                    if final:
+                        self.error('truncated document')
+                    return
+                continue
+            if self.scan is None:
+                while self.pos < len(buffer) and buffer[self.pos] in WHITESPACE:
+                    self.pos += 1
+                if self.pos >= len(buffer):
+                    if final and self.expect != 'end':
+                        self.error('truncated document')
+                    return
+            char = buffer[self.pos:self.pos + 1]
+            if self.scan is not None or (char == b'"' and self.expect in ('key', 'key_or_end', 'value', 'value_or_end')):
+                raw = self.read_string()
+                if raw is None:
+                    if final:
+                        self.error('unterminated string')
+                    return
+                if self.expect in ('key', 'key_or_end'):
+                    self.stack[-1][0] = json.loads(b'"' + raw + b'"')
+                    self.expect       = 'colon'
+                else:
+                    self.value_start()
+                    self.value_end()
+            elif char in (b'{', b'[') and self.expect in ('value', 'value_or_end'):
+                self.value_start()
+                self.pos += 1
+                if self.found:
+                    break
+                if len(self.stack) >= len(self.steps) or not self.on_path():
+                    self.skip = 1   # nothing below this container can match
+                elif char == b'{':
+                    self.stack.append([None, 'object'])
+                    self.expect = 'key_or_end'
+                else:
+                    self.stack.append([0, 'array'])
+                    self.expect = 'value_or_end'
+            elif char == b'}' and self.expect in ('comma', 'key_or_end') and self.stack[-1][1] == 'object' \
+              or char == b']' and self.expect in ('comma', 'value_or_end') and self.stack[-1][1] == 'array':
+                self.pos += 1
+                self.stack.pop()
+                self.value_end()
+            elif char == b',' and self.expect == 'comma':
+                self.pos += 1
+                frame = self.stack[-1]
+                if frame[1] == 'array':
+                    frame[0]   += 1
+                    self.expect = 'value'
+                else:
+                    self.expect = 'key'
+            elif char == b':' and self.expect == 'colon':
+                self.pos   += 1
+                self.expect = 'value'
+            elif self.expect in ('value', 'value_or_end') and (match := SCALAR.match(buffer, self.pos)):
+                if match.end() == len(buffer) and not final:
+                    return   # the number or literal may go on in the next chunk
+                try:
+                    json.loads(match.group())
+                except ValueError:
+                    self.error(f'unexpected token {bytes(match.group()[:20])!r}')
+                self.pos = match.end()
+                self.value_start()
+                self.value_end()
+            else:
+                self.error(f'unexpected {char.decode(errors="replace")!r}')
+
+    def skip_container(self):
+        # Jump from bracket to bracket; returns False when the container goes on in the next chunk
+        while self.skip:
+            if self.scan is None:
+                match = STRUCTURE.search(self.buffer, self.pos)
+                if not match:
+                    self.pos = len(self.buffer)
+                    return False
+                self.pos = match.start()
+            if self.scan is not None or self.buffer[self.pos] == 0x22:
+                if self.read_string() is None:
+                    return False
+            elif self.buffer[self.pos] in b'{[':
+                self.skip += 1
+                self.pos  += 1
+            else:
+                self.skip -= 1
+                self.pos  += 1
+        self.value_end()
+        return True
+
+    def read_string(self):
+        # Returns the raw bytes between the quotes, or None when the closing quote is not buffered yet
+        start = self.pos + 1
+        scan  = start if self.scan is None else self.scan
+        while True:
+            end = self.buffer.find(b'"', scan)
+            if end < 0:
+                self.scan = len(self.buffer)
+                return None
+            backslashes = 0
+            while end - 1 - backslashes >= start and self.buffer[end - 1 - backslashes] == 0x5c:
+                backslashes += 1
+            if backslashes % 2 == 0:
+                self.scan = None
+                self.pos  = end + 1
+                return bytes(self.buffer[start:end])
+            scan = end + 1
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from monitor.scheduler import ActionScheduler
+from monitor.tasks import dispatch_actions
+
+import signal
+import sys
+
+class Command(BaseCommand):
+    help = 'Run the in-process action scheduler (replaces the 30 s beat poll)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Starting action scheduler...')
+        # Exit through the scheduler's cleanup so its shard leases are released on stop
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        ActionScheduler(dispatch_actions).run()
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand
+from monitor.scheduler import DispatchLimiter, next_slot
+
+import heapq
+import random
+import statistics
+
+class Command(BaseCommand):
+    help = 'Simulate scheduler dispatch load: 30 s beat burst vs phased, rate-limited dispatch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actions'     , type=int  , default=5000)
+        parser.add_argument('--frequencies' , type=str  , default='30,60,120,300', help='Comma separated sensor frequencies (seconds)')
+        parser.add_argument('--duration'    , type=int  , default=1800, help='Simulated seconds')
+        parser.add_argument('--workers'     , type=int  , default=50)
+        parser.add_argument('--service-time', type=float, default=1.0 , help='Seconds a worker spends on one check')
+        parser.add_argument('--rate'        , type=float, default=0   , help='SCHEDULER_DISPATCH_RATE to simulate')
+        parser.add_argument('--burst'       , type=int  , default=50)
+        parser.add_argument('--beat'        , type=int  , default=30  , help='Beat interval of the legacy poll')
+        parser.add_argument('--seed'        , type=int  , default=42)
+
+    def handle(self, *args, **options):
+        rng         = random.Random(options['seed'])
+        frequencies = [int(f) for f in options['frequencies'].split(',')]
+        actions     = [(action_id, rng.choice(frequencies)) for action_id in range(1, options['actions'] + 1)]
+        duration    = options['duration']
+        capacity    = options['workers'] / options['service_time']
+        warmup      = max(frequencies)
+
+        beat   = self.simulate_beat(actions, duration, options['beat'])
+        phased = self.simulate_phased(actions, duration, DispatchLimiter(options['rate'], options['burst']))
+
+        self.stdout.write(f"{len(actions)} actions, {duration} s, capacity {capacity:.1f} checks/s (stats after {warmup} s warm-up)")
+        self.stdout.write(f"{'':>8} {'mean/s':>8} {'peak/s':>8} {'stdev':>8} {'max queue':>10} {'mean util':>10} {'util stdev':>11}")
+        for name, arrivals in (('beat', beat), ('phased', phased)):
+            self.report(name, arrivals[warmup:], capacity)
+
+    def simulate_beat(self, actions, duration, interval):
+        # Legacy behaviour: every action overdue at a tick is queued in that same second
+        arrivals = [0] * duration
+        last_run = {action_id: 0 for action_id, _ in actions}
+        for tick in range(0, duration, interval):
+            for action_id, frequency in actions:
+                if last_run[action_id] <= tick - frequency or tick == 0:
+                    arrivals[tick]     += 1
+                    last_run[action_id] = tick
+        return arrivals
+
+    def simulate_phased(self, actions, duration, limiter):
+        # next_slot() phases and the dispatch limiter, exactly as the scheduler uses them
+        arrivals = [0] * duration
+        origin   = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        due      = [(next_slot(action_id, frequency, origin), action_id, frequency) for action_id, frequency in actions]
+        heapq.heapify(due)
+        while due:
+            run_at, action_id, frequency = heapq.heappop(due)
+            second = int(limiter.reserve((run_at - origin).total_seconds()))
+            if second >= duration:
+                continue
+            arrivals[second] += 1
+            heapq.heappush(due, (next_slot(action_id, frequency, run_at), action_id, frequency))
+        return arrivals
+
+    def report(self, name, arrivals, capacity):
+        queue, max_queue, utilization = 0.0, 0.0, []
+        for arrived in arrivals:
+            work       = queue + arrived
+            done       = min(work, capacity)
+            queue      = work - done
+            max_queue  = max(max_queue, queue)
+            utilization.append(done / capacity)
+        self.stdout.write(
+            f"{name:>8} {statistics.mean(arrivals):>8.1f} {max(arrivals):>8} {statistics.pstdev(arrivals):>8.1f} "
+            f"{max_queue:>10.0f} {statistics.mean(utilization):>10.0%} {statistics.pstdev(utilization):>11.2f}"
+        )
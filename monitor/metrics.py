@@ -0,0 +1,16 @@
+from common.utils import get_redis
+
+import logging
+
+logger      = logging.getLogger('celery_process')
+METRICS_KEY = 'djanguard:metrics'
+
+def incr(name, amount=1):
+    # Process-independent counters, kept in a single Redis hash
+    try:
+        get_redis().hincrby(METRICS_KEY, name, amount)
+    except Exception as exc:
+        logger.error(f'Could not update metric {name}: {exc}')
+
+def snapshot():
+    return {name.decode(): int(value) for name, value in get_redis().hgetall(METRICS_KEY).items()}
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:45
+
+import django.utils.timezone
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import DateTimeField, ExpressionWrapper, F, OuterRef, Subquery, Value
+
+
+def seed_next_run_at(apps, schema_editor):
+    # One UPDATE for all actions: last_execution + sensor frequency
+    Action    = apps.get_model('monitor', 'Action')
+    Sensor    = apps.get_model('monitor', 'Sensor')
+    frequency = Subquery(Sensor.objects.filter(pk=OuterRef('sensor_id')).values('frequency')[:1])
+    Action.objects.update(next_run_at=ExpressionWrapper(
+        F('last_execution') + frequency * Value(timedelta(seconds=1)),
+        output_field=DateTimeField()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0028_remove_userprofile_telegram_bot_token_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='next_run_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='When the scheduler should run this action next'),
+        ),
+        migrations.RunPython(seed_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0029_action_next_run_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('shard', models.IntegerField(primary_key=True, serialize=False)),
+                ('owner', models.CharField(blank=True, default='', help_text='Scheduler node currently owning this shard', max_length=100)),
+                ('expires_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
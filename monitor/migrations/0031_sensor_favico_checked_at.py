@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0030_schedulerlease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='favico_checked_at',
+            field=models.DateTimeField(blank=True, help_text='Last favicon lookup, refreshed every FAVICON_TTL or on URL change', null=True),
+        ),
+    ]
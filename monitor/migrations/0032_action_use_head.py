@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0031_sensor_favico_checked_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='use_head',
+            field=models.BooleanField(default=False, help_text='status_code checks: send HEAD instead of GET'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0032_action_use_head'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresult',
+            name='connect_ms',
+            field=models.FloatField(blank=True, help_text='TCP connect and TLS handshake (ms), empty when a pooled connection was reused', null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='dns_ms',
+            field=models.FloatField(blank=True, help_text='DNS lookup (ms), empty when the cached entry was used', null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='total_ms',
+            field=models.FloatField(blank=True, help_text='Total check duration including the body (ms)', null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='ttfb_ms',
+            field=models.FloatField(blank=True, help_text='Time to the response headers (ms)', null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0033_testresult_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Bumped on every change of the action or its sensor, versions the cached check plans'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0034_action_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='wait_timeout',
+            field=models.IntegerField(blank=True, help_text='Browser checks: ms to wait for an element, text or title (default BROWSER_WAIT_TIMEOUT)', null=True),
+        ),
+    ]
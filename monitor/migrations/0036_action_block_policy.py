@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0035_action_wait_timeout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='block_policy',
+            field=models.CharField(choices=[('none', 'Load everything'), ('assert_only', 'Assert only: block images, media, fonts and trackers'), ('custom', 'Custom rules')], default='none', help_text='Browser checks: requests aborted before download (presets do not apply to screenshots)', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='action',
+            name='block_rules',
+            field=models.JSONField(blank=True, default=dict, help_text='Custom policy: {"resource_types": ["image", ...], "domains": ["ads.example.com", "*.tracker.net"]}'),
+        ),
+    ]
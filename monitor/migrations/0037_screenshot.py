@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0036_action_block_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Screenshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('digest', models.CharField(db_index=True, help_text='sha256 of the stored image, names the blob under DATA_DIR/screenshots', max_length=64)),
+                ('extension', models.CharField(default='.webp', max_length=10)),
+                ('size', models.IntegerField(default=0, help_text='Bytes')),
+                ('action', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='screenshots', to='monitor.action')),
+            ],
+        ),
+    ]
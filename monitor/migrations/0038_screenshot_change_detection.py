@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0037_screenshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='diff_threshold',
+            field=models.FloatField(blank=True, help_text='Screenshots: fail when more than this share of the image changed (0-1), empty never fails', null=True),
+        ),
+        migrations.AddField(
+            model_name='screenshot',
+            name='dhash',
+            field=models.CharField(blank=True, default='', help_text='64-bit difference hash, hex', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='screenshot',
+            name='thumb',
+            field=models.BinaryField(blank=True, help_text='64x64 grayscale pixels compared with the next capture', null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='change_score',
+            field=models.FloatField(blank=True, help_text='Screenshots: share of the image that changed since the previous capture (0-1)', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:06
+
+import django.db.models.deletion
+import django_cryptography.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0038_screenshot_change_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorSession',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='browser_session', serialize=False, to='monitor.sensor')),
+                ('state', django_cryptography.fields.encrypt(models.TextField(help_text='Playwright storage_state (cookies and localStorage) saved after the login block'))),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0039_sensorsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='engine',
+            field=models.CharField(choices=[('auto', 'Automatic: plain HTML when the script allows it'), ('browser', 'Browser'), ('static', 'Plain HTML, no JavaScript')], default='auto', help_text='Selenium scripts: where they run; static only supports presence, text and title checks', max_length=10),
+        ),
+    ]
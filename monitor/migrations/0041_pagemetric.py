@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0040_action_engine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(default='goto', help_text='What loaded the page: goto for the start URL, else the DSL command', max_length=50)),
+                ('line', models.IntegerField(default=0, help_text='Script line of the command, 0 for the start URL')),
+                ('url', models.TextField()),
+                ('ttfb_ms', models.FloatField(blank=True, help_text='Navigation Timing responseStart (ms)', null=True)),
+                ('dom_content_loaded_ms', models.FloatField(blank=True, help_text='Navigation Timing domContentLoadedEventEnd (ms)', null=True)),
+                ('load_ms', models.FloatField(blank=True, help_text='Navigation Timing loadEventEnd (ms)', null=True)),
+                ('lcp_ms', models.FloatField(blank=True, help_text='Largest Contentful Paint (ms)', null=True)),
+                ('cls', models.FloatField(blank=True, help_text='Cumulative Layout Shift', null=True)),
+                ('transfer_bytes', models.BigIntegerField(default=0, help_text='Bytes of the document and its resources over the network (0 for cross-origin resources without Timing-Allow-Origin)')),
+                ('requests', models.IntegerField(default=0)),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_metrics', to='monitor.testresult')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0041_pagemetric'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagemetric',
+            name='block_policy',
+            field=models.CharField(choices=[('none', 'Load everything'), ('assert_only', 'Assert only: block images, media, fonts and trackers'), ('custom', 'Custom rules')], default='none', help_text='Request blocking of the run: with blocked requests, LCP, bytes and requests are not those of a real visit', max_length=20),
+        ),
+    ]
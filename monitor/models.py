@@ -3,6 +3,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django_cryptography.fields import encrypt
 from django.conf import settings
+from django.utils import timezone
 
 import json
 
@@ -25,6 +26,18 @@ ASSERTION_TYPES = [
     ('json_key_exists' , 'JSON Key Exists'),
 ]
 
+BLOCK_POLICIES = [
+    ('none'       , 'Load everything'),
+    ('assert_only', 'Assert only: block images, media, fonts and trackers'),
+    ('custom'     , 'Custom rules'),
+]
+
+ENGINES = [
+    ('auto'   , 'Automatic: plain HTML when the script allows it'),
+    ('browser', 'Browser'),
+    ('static' , 'Plain HTML, no JavaScript'),
+]
+
 class Action(models.Model):
     action_name     = models.CharField(max_length=100)
     action_type     = models.CharField(max_length=10, choices=HTTP_VERBS, default='GET')
@@ -36,6 +49,14 @@ class Action(models.Model):
     expected_value  = models.CharField(max_length=200, help_text="The expected value for this assertion")
     selenium_script = encrypt(models.TextField(null=True, blank=True, help_text="Selenium Style script"))  # Changed to TextField
     sequence        = models.IntegerField(help_text="Order of the command",default=0) 
+    block_policy    = models.CharField(max_length=20, choices=BLOCK_POLICIES, default='none', help_text="Browser checks: requests aborted before download (presets do not apply to screenshots)")
+    block_rules     = models.JSONField(default=dict, blank=True, help_text='Custom policy: {"resource_types": ["image", ...], "domains": ["ads.example.com", "*.tracker.net"]}')
+    diff_threshold  = models.FloatField(null=True, blank=True, help_text="Screenshots: fail when more than this share of the image changed (0-1), empty never fails")
+    wait_timeout    = models.IntegerField(null=True, blank=True, help_text="Browser checks: ms to wait for an element, text or title (default BROWSER_WAIT_TIMEOUT)")
+    engine          = models.CharField(max_length=10, choices=ENGINES, default='auto', help_text="Selenium scripts: where they run; static only supports presence, text and title checks")
+    use_head        = models.BooleanField(default=False, help_text="status_code checks: send HEAD instead of GET")
+    next_run_at     = models.DateTimeField(default=timezone.now, db_index=True, help_text="When the scheduler should run this action next")
+    updated_at      = models.DateTimeField(auto_now=True, help_text="Bumped on every change of the action or its sensor, versions the cached check plans")
 
     def __str__(self):
         return f"{self.action_name} ({self.get_action_type_display()})"
@@ -48,6 +69,7 @@ class Sensor(models.Model):
     name      = models.CharField(max_length=100)
     url       = models.URLField(max_length=200)
     favico    = models.CharField(null=True, blank=True)
+    favico_checked_at = models.DateTimeField(null=True, blank=True, help_text="Last favicon lookup, refreshed every FAVICON_TTL or on URL change")
     frequency = models.IntegerField(help_text="Frequency in minutes to check the website")
 
     def get_actions_count(self):
@@ -63,10 +85,60 @@ class TestResult(models.Model):
     actual_value   = models.CharField(max_length=100, null=True, blank=True, help_text="Actual value observed during the test")
     timestamp      = models.DateTimeField(auto_now_add=True)
     body           = models.CharField(max_length=255, null=True, blank=True, help_text="Add more context to the results")
+    dns_ms         = models.FloatField(null=True, blank=True, help_text="DNS lookup (ms), empty when the cached entry was used")
+    connect_ms     = models.FloatField(null=True, blank=True, help_text="TCP connect and TLS handshake (ms), empty when a pooled connection was reused")
+    ttfb_ms        = models.FloatField(null=True, blank=True, help_text="Time to the response headers (ms)")
+    total_ms       = models.FloatField(null=True, blank=True, help_text="Total check duration including the body (ms)")
+    change_score   = models.FloatField(null=True, blank=True, help_text="Screenshots: share of the image that changed since the previous capture (0-1)")
 
     def __str__(self):
         return f"{self.test_type} test for action '{self.action.action_name}' at {self.timestamp}"
 
+class SensorSession(models.Model):
+    sensor     = models.OneToOneField(Sensor, on_delete=models.CASCADE, primary_key=True, related_name='browser_session')
+    state      = encrypt(models.TextField(help_text="Playwright storage_state (cookies and localStorage) saved after the login block"))
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Browser session of {self.sensor} until {self.expires_at}"
+
+class PageMetric(models.Model):
+    result                = models.ForeignKey(TestResult, on_delete=models.CASCADE, related_name='page_metrics')
+    command               = models.CharField(max_length=50, default='goto', help_text="What loaded the page: goto for the start URL, else the DSL command")
+    line                  = models.IntegerField(default=0, help_text="Script line of the command, 0 for the start URL")
+    url                   = models.TextField()
+    ttfb_ms               = models.FloatField(null=True, blank=True, help_text="Navigation Timing responseStart (ms)")
+    dom_content_loaded_ms = models.FloatField(null=True, blank=True, help_text="Navigation Timing domContentLoadedEventEnd (ms)")
+    load_ms               = models.FloatField(null=True, blank=True, help_text="Navigation Timing loadEventEnd (ms)")
+    lcp_ms                = models.FloatField(null=True, blank=True, help_text="Largest Contentful Paint (ms)")
+    cls                   = models.FloatField(null=True, blank=True, help_text="Cumulative Layout Shift")
+    transfer_bytes        = models.BigIntegerField(default=0, help_text="Bytes of the document and its resources over the network (0 for cross-origin resources without Timing-Allow-Origin)")
+    requests              = models.IntegerField(default=0)
+    block_policy          = models.CharField(max_length=20, choices=BLOCK_POLICIES, default='none', help_text="Request blocking of the run: with blocked requests, LCP, bytes and requests are not those of a real visit")
+
+    def __str__(self):
+        return f"Page metrics of test '{self.result_id}' after {self.command}"
+
+class Screenshot(models.Model):
+    action    = models.ForeignKey(Action, on_delete=models.CASCADE, related_name='screenshots')
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    digest    = models.CharField(max_length=64, db_index=True, help_text="sha256 of the stored image, names the blob under DATA_DIR/screenshots")
+    extension = models.CharField(max_length=10, default='.webp')
+    size      = models.IntegerField(default=0, help_text="Bytes")
+    dhash     = models.CharField(max_length=16, blank=True, default='', help_text="64-bit difference hash, hex")
+    thumb     = models.BinaryField(null=True, blank=True, help_text="64x64 grayscale pixels compared with the next capture")
+
+    def __str__(self):
+        return f"Screenshot of action '{self.action_id}' at {self.timestamp}"
+
+class SchedulerLease(models.Model):
+    shard      = models.IntegerField(primary_key=True)
+    owner      = models.CharField(max_length=100, blank=True, default='', help_text="Scheduler node currently owning this shard")
+    expires_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Shard {self.shard} owned by {self.owner or 'nobody'} until {self.expires_at}"
+
 class UserProfile(models.Model):
     user                    = models.OneToOneField(User, on_delete=models.CASCADE)
     is_paying_user          = models.BooleanField(default=False)
@@ -0,0 +1,74 @@
+from .blocking import block_policy
+from .http import check_timeout
+from .jsonstream import parse_path
+from .models import Action
+from .selenium_dsl import get_program
+from collections import OrderedDict
+from django.conf import settings
+
+import json
+import logging
+
+logger = logging.getLogger('celery_process')
+
+class CheckPlan:
+    """
+    Everything a check needs that only depends on the Action and its Sensor, worked out
+    once: the request (URL, method, headers, body), the parsed JSON path, the compiled
+    DSL script and the request blocking policy of browser checks. `action` is the loaded instance, sensor and user included.
+    """
+    def __init__(self, action):
+        self.error = None
+        try:
+            # A JSON string, or an object stored as is through the API
+            payload = action.payload if isinstance(action.payload, dict) else json.loads(action.payload) if action.payload else None
+            headers = payload.get('headers', {}) if payload else None
+            data    = payload.get('data'   , {}) if payload else None
+        except (ValueError, TypeError, AttributeError) as exc:
+            headers, data, self.error = None, None, exc   # raised again by every run of this action only
+        self.action         = action
+        self.version        = action.updated_at
+        self.assertion_type = action.assertion_type
+        self.expected_value = action.expected_value
+        self.url            = action.sensor.url + action.action_path
+        self.method         = 'HEAD' if action.assertion_type == 'status_code' and action.use_head and action.action_type == 'GET' else action.action_type
+        self.headers        = headers
+        self.data           = data
+        self.json_path      = None
+        self.program        = None
+        self.block          = block_policy(action)
+        self.timeout        = check_timeout(action.sensor.frequency)
+        if action.assertion_type == 'json_key_exists':
+            try:
+                self.json_path = parse_path(action.expected_value)
+            except ValueError:
+                self.json_path = action.expected_value   # reported by the check itself
+        elif action.assertion_type == 'selenium':
+            self.program = get_program(action.selenium_script)
+
+# Worker-local cache: action id -> CheckPlan, least recently used first
+_plans = OrderedDict()
+
+def get_plans(action_ids):
+    """
+    Plans for those of `action_ids` that still exist. One cheap query reads the
+    updated_at stamps; only actions missing from the cache or changed since their plan
+    was compiled are loaded and compiled again.
+    """
+    versions = dict(Action.objects.filter(id__in=action_ids).values_list('id', 'updated_at'))
+    stale    = [action_id for action_id, version in versions.items() if action_id not in _plans or _plans[action_id].version != version]
+    if stale:
+        for action in Action.objects.select_related('sensor', 'sensor__user').filter(id__in=stale):
+            _plans[action.id] = CheckPlan(action)
+    plans = []
+    for action_id in versions:
+        if action_id in _plans:
+            _plans.move_to_end(action_id)
+            plans.append(_plans[action_id])
+    while len(_plans) > settings.CHECK_PLAN_CACHE_SIZE:
+        _plans.popitem(last=False)
+    return plans
+
+def invalidate(*action_ids):
+    for action_id in action_ids:
+        _plans.pop(action_id, None)
@@ -0,0 +1,265 @@
+from .models import Action, SchedulerLease, Sensor
+from common.utils import get_redis
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest, Mod
+from django.utils import timezone
+
+import heapq
+import json
+import logging
+import math
+import os
+import socket
+import time
+
+logger = logging.getLogger('celery_process')
+
+# Knuth's multiplicative hash spreads consecutive action ids evenly over a frequency window
+PHASE_MULTIPLIER = 2654435761
+
+def phase_offset(action_id, frequency):
+    return (action_id * PHASE_MULTIPLIER) % max(frequency, 1)
+
+def next_slot(action_id, frequency, after):
+    """
+    First run time strictly after `after` that falls on the action's phase.
+    Every action keeps a fixed, deterministic offset inside its frequency window,
+    so actions sharing a frequency are spread over the window instead of bunching up.
+    """
+    frequency = max(frequency, 1)
+    seconds   = int(after.timestamp())
+    return datetime.fromtimestamp(seconds + frequency - (seconds - phase_offset(action_id, frequency)) % frequency, tz=dt_timezone.utc)
+
+def next_run_expression(after, frequency=None):
+    # SQL twin of next_slot(), evaluated row by row inside the UPDATE
+    if frequency is None:
+        frequency = Greatest(Subquery(Sensor.objects.filter(pk=OuterRef('sensor_id')).values('frequency')[:1]), 1)
+    else:
+        frequency = Value(max(frequency, 1))
+    seconds = int(after.timestamp())
+    phase   = Mod(F('id') * Value(PHASE_MULTIPLIER), frequency)
+    offset  = frequency - Mod(Value(seconds) - phase, frequency)
+    return ExpressionWrapper(
+        Value(datetime.fromtimestamp(seconds, tz=dt_timezone.utc)) + offset * Value(timedelta(seconds=1)),
+        output_field=DateTimeField()
+    )
+
+def claim_due_actions(now, limit=None, ids=None, horizon=None):
+    """
+    Pick the actions due by `horizon` (default `now`) with one indexed range query and
+    claim them with one UPDATE. Returns (action id, due time, assertion type) tuples in due order.
+    """
+    limit   = limit or settings.SCHEDULER_BATCH_SIZE
+    horizon = horizon or now
+    due     = Action.objects.filter(next_run_at__lte=horizon)
+    if ids is not None:
+        due = due.filter(id__in=ids)
+    with transaction.atomic():
+        # Rows locked by another scheduler are skipped, so concurrent schedulers never claim the same slot
+        claimed = list(due.select_for_update(skip_locked=True).order_by('next_run_at').values_list('id', 'next_run_at', 'assertion_type')[:limit])
+        if claimed:
+            Action.objects.filter(id__in=[action_id for action_id, _, _ in claimed]).update(
+                last_execution = now,
+                next_run_at    = next_run_expression(horizon)
+            )
+    return claimed
+
+def sync_sensor_actions(sensor):
+    # Move the sensor's actions onto the slots of its (possibly new) frequency
+    return Action.objects.filter(sensor=sensor).update(next_run_at=next_run_expression(timezone.now(), sensor.frequency))
+
+class DispatchLimiter:
+    """
+    Token bucket smoothing dispatches to `rate` per second (0 disables it), allowing
+    short bursts of `burst`. reserve() returns when a dispatch wanted at `at` may go out.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate      = rate
+        self.burst     = max(burst, 1)
+        self.next_free = 0.0
+
+    def reserve(self, at):
+        if not self.rate:
+            return at
+        interval       = 1.0 / self.rate
+        self.next_free = max(self.next_free, at - (self.burst - 1) * interval)
+        slot           = max(self.next_free, at)
+        self.next_free += interval
+        return slot
+
+def publish_schedule_event(**event):
+    # Tell the scheduler daemon that an action or sensor changed, once the change is committed
+    def publish():
+        try:
+            get_redis().publish(settings.SCHEDULER_CHANNEL, json.dumps(event))
+        except Exception as exc:
+            logger.error(f'Could not publish scheduler event {event}: {exc}')
+    transaction.on_commit(publish)
+
+class ShardLeases:
+    """
+    Splits the action space (action id % SCHEDULER_SHARDS) between scheduler nodes.
+    Each node renews its leases every third of a lease, takes free or expired shards
+    up to its fair share and hands back any surplus, so the shards of a dead node are
+    picked up by the survivors as soon as its leases run out.
+    """
+    def __init__(self, node_id=None, shards=None, lease_seconds=None):
+        self.node_id       = node_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.shards        = shards or settings.SCHEDULER_SHARDS
+        self.lease_seconds = lease_seconds or settings.SCHEDULER_LEASE_SECONDS
+        self.owned         = set()
+        self.valid_until   = 0.0
+        self.next_renewal  = 0.0
+
+    def owns(self, action_id):
+        return action_id % self.shards in self.owned
+
+    def filter(self, actions):
+        return actions.annotate(shard=Mod('id', Value(self.shards))).filter(shard__in=self.owned)
+
+    def is_valid(self):
+        return time.monotonic() < self.valid_until
+
+    def due(self):
+        return time.monotonic() >= self.next_renewal
+
+    def heartbeat(self):
+        # Live nodes are tracked in a Redis sorted set scored by their last heartbeat
+        nodes = f'{settings.SCHEDULER_CHANNEL}:nodes'
+        now   = time.time()
+        with get_redis().pipeline() as pipe:
+            pipe.zadd(nodes, {self.node_id: now})
+            pipe.zremrangebyscore(nodes, '-inf', now - self.lease_seconds)
+            pipe.zcard(nodes)
+            return pipe.execute()[-1]
+
+    def renew(self):
+        """Renew, acquire and release leases. Returns True when the owned shards changed."""
+        started = time.monotonic()
+        now     = timezone.now()
+        expires = now + timedelta(seconds=self.lease_seconds)
+        live    = self.heartbeat()
+        with transaction.atomic():
+            SchedulerLease.objects.bulk_create([SchedulerLease(shard=shard) for shard in range(self.shards)], ignore_conflicts=True)
+            leases = list(
+                SchedulerLease.objects.select_for_update(skip_locked=True)
+                                      .filter(shard__lt=self.shards)
+                                      .filter(Q(owner=self.node_id) | Q(expires_at__lte=now) | Q(owner=''))
+                                      .order_by('shard')
+            )
+            fair  = math.ceil(self.shards / live)
+            mine  = [lease.shard for lease in leases if lease.owner == self.node_id and lease.expires_at > now]
+            free  = [lease.shard for lease in leases if lease.shard not in mine]
+            keep  = mine[:fair] + free[:max(fair - len(mine), 0)]
+            SchedulerLease.objects.filter(shard__in=keep).update(owner=self.node_id, expires_at=expires)
+            SchedulerLease.objects.filter(shard__in=mine[fair:]).update(owner='', expires_at=now)
+        owned, self.owned = self.owned, set(keep)
+        self.valid_until  = started + self.lease_seconds
+        self.next_renewal = started + self.lease_seconds / 3
+        if owned != self.owned:
+            logger.info(f'Scheduler {self.node_id} now owns shards {sorted(self.owned)} ({live} nodes)')
+        return owned != self.owned
+
+    def release(self):
+        SchedulerLease.objects.filter(owner=self.node_id).update(owner='', expires_at=timezone.now())
+        get_redis().zrem(f'{settings.SCHEDULER_CHANNEL}:nodes', self.node_id)
+        self.owned = set()
+
+class ActionScheduler:
+    """
+    Long-running scheduler keeping the next run of every action of its shards in an
+    in-memory heap. The heap is rebuilt from the DB on start, when the owned shards
+    change and every SCHEDULER_RESYNC_INTERVAL, then kept up to date with the events
+    published by the model signals.
+    """
+    def __init__(self, dispatch, leases=None):
+        self.dispatch = dispatch
+        self.leases   = leases or ShardLeases()
+        self.heap     = []   # (due timestamp, action id), stale entries are skipped lazily
+        self.due_at   = {}   # action id -> current due timestamp
+
+    def schedule(self, action_id, next_run_at):
+        due = next_run_at.timestamp()
+        self.due_at[action_id] = due
+        heapq.heappush(self.heap, (due, action_id))
+
+    def unschedule(self, action_id):
+        self.due_at.pop(action_id, None)
+
+    def reload(self, actions):
+        for action_id, next_run_at in self.leases.filter(actions).values_list('id', 'next_run_at'):
+            self.schedule(action_id, next_run_at)
+
+    def rebuild(self):
+        self.heap   = []
+        self.due_at = {}
+        self.reload(Action.objects.all())
+        logger.info(f'Scheduler rebuilt with {len(self.due_at)} actions')
+
+    def pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            timestamp, action_id = heapq.heappop(self.heap)
+            if self.due_at.get(action_id) == timestamp:
+                del self.due_at[action_id]
+                due.append(action_id)
+        return due
+
+    def seconds_until_next(self, now):
+        while self.heap and self.due_at.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return settings.SCHEDULER_MAX_SLEEP
+        return min(max(self.heap[0][0] - now, 0), settings.SCHEDULER_MAX_SLEEP)
+
+    def tick(self):
+        if self.leases.due() and self.leases.renew():
+            self.rebuild()
+        if not self.leases.is_valid():
+            # Could not renew in time: the shards may already belong to another node
+            return []
+        now = timezone.now()
+        due = self.pop_due(now.timestamp())
+        if not due:
+            return []
+        claimed = claim_due_actions(now, limit=len(due), ids=due)
+        if claimed:
+            self.dispatch(claimed)
+        # Re-read the due rows: claimed ones get their new slot, edited ones their real slot, deleted ones drop out
+        self.reload(Action.objects.filter(id__in=due))
+        return claimed
+
+    def apply_event(self, event):
+        if 'action' in event:
+            self.unschedule(event['action'])
+            if not event.get('deleted') and self.leases.owns(event['action']):
+                self.reload(Action.objects.filter(id=event['action']))
+        elif 'sensor' in event:
+            self.reload(Action.objects.filter(sensor_id=event['sensor']))
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(settings.SCHEDULER_CHANNEL)
+                    self.leases.renew()
+                    self.rebuild()
+                    next_resync = time.monotonic() + settings.SCHEDULER_RESYNC_INTERVAL
+                    while time.monotonic() < next_resync:
+                        close_old_connections()
+                        self.tick()
+                        message = pubsub.get_message(timeout=self.seconds_until_next(time.time()))
+                        while message:
+                            self.apply_event(json.loads(message['data']))
+                            message = pubsub.get_message()
+                    pubsub.close()
+                except Exception as exc:
+                    logger.error(f'Scheduler loop failed, rebuilding: {exc}')
+                    time.sleep(settings.SCHEDULER_MAX_SLEEP)
+        finally:
+            # Hand the shards over right away instead of waiting for the leases to expire
+            self.leases.release()
@@ -0,0 +1,122 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db.models import Max
+from PIL import Image
+
+import asyncio
+import hashlib
+import io
+import numpy as np
+import os
+import re
+import tempfile
+
+EXTENSIONS    = {'webp': '.webp', 'jpeg': '.jpg'}
+CONTENT_TYPES = {'.webp': 'image/webp', '.jpg': 'image/jpeg', '.png': 'image/png'}
+LEGACY_FILE   = re.compile(r'\d+_\d+_\d{14}\.(jpg|webp)$')
+
+THUMB_SIZE    = 64   # side of the grayscale thumbnail kept for the pixel diff
+
+Capture = namedtuple('Capture', 'digest path size dhash thumb')
+
+_executor = None
+
+def get_executor():
+    # Pillow releases the GIL while decoding, resizing and encoding, so threads are enough
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.SCREENSHOT_WORKERS, thread_name_prefix='screenshot')
+    return _executor
+
+def extension():
+    return EXTENSIONS[settings.SCREENSHOT_FORMAT]
+
+def encode(png):
+    """
+    Downscale a PNG capture to fit SCREENSHOT_SIZE and encode it as SCREENSHOT_FORMAT.
+    Returns the encoded bytes, the 64-bit difference hash and the diff thumbnail.
+    """
+    with Image.open(io.BytesIO(png)) as img:
+        img = img.convert('RGB')
+        img.thumbnail((settings.SCREENSHOT_SIZE, settings.SCREENSHOT_SIZE), Image.LANCZOS)
+        output = io.BytesIO()
+        img.save(output, format=settings.SCREENSHOT_FORMAT.upper(), quality=settings.SCREENSHOT_QUALITY)
+        gray = img.convert('L')
+        return output.getvalue(), dhash(gray), gray.resize((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR).tobytes()
+
+def dhash(gray):
+    # Difference hash: one bit per horizontally adjacent pixel pair of a 9x8 thumbnail
+    pixels = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes().hex()
+
+def hash_distance(first, second):
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+def change_score(previous, thumb):
+    """Share of thumbnail pixels whose gray level moved by more than SCREENSHOT_DIFF_TOLERANCE."""
+    before = np.frombuffer(previous, dtype=np.uint8).astype(np.int16)
+    after  = np.frombuffer(thumb, dtype=np.uint8).astype(np.int16)
+    if before.shape != after.shape:
+        return 1.0
+    return float(np.mean(np.abs(after - before) > settings.SCREENSHOT_DIFF_TOLERANCE))
+
+def blob_path(digest, ext):
+    # Sharded by the first two byte pairs of the digest: screenshots/ab/cd/abcd....webp
+    return os.path.join(settings.DATA_DIR, 'screenshots', digest[:2], digest[2:4], digest + ext)
+
+def write(png):
+    """
+    Encode the capture and store it under its sha256. An identical image is already on
+    disk and is not written again. Returns a Capture.
+    """
+    data, hashed, thumb = encode(png)
+    digest              = hashlib.sha256(data).hexdigest()
+    path                = blob_path(digest, extension())
+    if os.path.exists(path):
+        os.utime(path)   # fresh mtime: prune() leaves blobs that were just reused alone
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename, so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp, path)
+    return Capture(digest, path, len(data), hashed, thumb)
+
+async def store(png):
+    """Encode, hash and store an in-memory capture off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), write, png)
+
+def prune(before):
+    """
+    Delete the Screenshot rows older than `before`, keeping the latest one of every
+    action, then the blobs no row points to anymore. Legacy flat files
+    ({action}_{user}_{timestamp}.jpg in DATA_DIR) older than `before` go as well.
+    Returns (rows, files) deleted.
+    """
+    from .models import Screenshot
+
+    latest = Screenshot.objects.values('action_id').annotate(latest=Max('id')).values('latest')
+    old    = Screenshot.objects.filter(timestamp__lt=before).exclude(id__in=latest)
+    blobs  = set(old.values_list('digest', 'extension'))
+    rows   = old.delete()[0]
+    still  = set(Screenshot.objects.filter(digest__in=[digest for digest, _ in blobs]).values_list('digest', 'extension'))
+    files  = 0
+    cutoff = before.timestamp()
+    for digest, ext in blobs - still:
+        path = blob_path(digest, ext)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                files += 1
+        except FileNotFoundError:
+            pass
+    for entry in os.scandir(settings.DATA_DIR):
+        if entry.is_file() and LEGACY_FILE.match(entry.name) and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            files += 1
+    return rows, files
+
+def content_type(filename):
+    return CONTENT_TYPES.get(os.path.splitext(filename)[1], 'application/octet-stream')
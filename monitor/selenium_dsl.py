@@ -1,10 +1,14 @@
-from .models import Action, TestResult, Sensor
-from bs4 import BeautifulSoup
+from . import screenshots, static_dsl, traces
+from .blocking import block_policy
+from .browser_pool import browser_context
+from .models import Action, Screenshot, TestResult, Sensor
+from .sessions import drop_session, load_session, save_session
+from .vitals import NAVIGATION_COMMANDS, PageMeter
+from collections import OrderedDict, namedtuple
 from django.conf import settings
 from django.utils import timezone
-from playwright.async_api import async_playwright
 from asgiref.sync import sync_to_async
-from PIL import Image
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, expect
 
 import asyncio
 import base64
@@ -16,23 +20,24 @@ import os
 logger = logging.getLogger('celery_process')
 
 class CommandHandler:
-    def __init__(self, page):
-        self.page = page
+    def __init__(self, page, timeout=None):
+        self.page       = page
+        self.timeout    = timeout or settings.BROWSER_WAIT_TIMEOUT  # ms any wait may take before the command fails
         self.secret_key = hashlib.sha256(settings.SECRET_KEY.encode()).digest()[:16] 
     
     async def check_element_exists(self, selector):
         logger.info(f'Checking if element exists: {selector}')
-        await self.page.wait_for_selector(selector, timeout=10000)
+        await self.page.wait_for_selector(selector, timeout=self.timeout)
         assert await self.page.locator(selector).count() > 0, f"Element {selector} not found"
 
     async def fill_input(self, selector, value):
         logger.info(f'Filling element {selector} with value: {value}')
-        await self.page.wait_for_selector(selector, timeout=10000)
+        await self.page.wait_for_selector(selector, timeout=self.timeout)
         await self.page.fill(selector, value)
 
     async def click_element(self, selector):
         logger.info(f'Clicking element: {selector}')
-        await self.page.wait_for_selector(selector, timeout=10000)
+        await self.page.wait_for_selector(selector, timeout=self.timeout)
         await self.page.click(selector)
         # Wait for navigation and get the new page content
         await self.page.wait_for_load_state('networkidle')
@@ -41,23 +46,29 @@ class CommandHandler:
 
     async def check_text_present(self, text):
         logger.info(f'Checking if text is present: {text}')
-        await self.page.wait_for_timeout(2000)  # Adding a small delay to allow text to appear
-        assert await self.page.locator(f'text={text}').count() > 0, f"Text '{text}' not found on page"
+        try:
+            await expect(self.page.locator(f'text={text}').first).to_be_attached(timeout=self.timeout)
+        except AssertionError:
+            raise AssertionError(f"Text '{text}' not found on page")
 
     async def assert_title(self, expected_title):
         logger.info(f'Asserting title is: {expected_title}')
-        await self.page.wait_for_timeout(2000)
-        assert await self.page.title() == expected_title, f"Title does not match: {expected_title}"
+        try:
+            await expect(self.page).to_have_title(expected_title, timeout=self.timeout)
+        except AssertionError:
+            raise AssertionError(f"Title does not match: {expected_title}")
 
     async def assert_element_present(self, selector):
         logger.info(f'Asserting element is present: {selector}')
-        await self.page.wait_for_selector(selector, timeout=10000)
+        await self.page.wait_for_selector(selector, timeout=self.timeout)
         assert await self.page.locator(selector).count() > 0, f"Element {selector} not found"
 
     async def assert_element_not_present(self, selector):
         logger.info(f'Asserting element is not present: {selector}')
-        await self.page.wait_for_timeout(2000)
-        assert await self.page.locator(selector).count() == 0, f"Element {selector} is present"
+        try:
+            await expect(self.page.locator(selector)).to_have_count(0, timeout=self.timeout)
+        except AssertionError:
+            raise AssertionError(f"Element {selector} is present")
 
     async def pause_execution(self):
         logger.info('Pausing execution')
@@ -73,7 +84,7 @@ class CommandHandler:
 
     async def double_click_element(self, selector):
         logger.info(f'Double-clicking element: {selector}')
-        await self.page.wait_for_selector(selector, timeout=10000)
+        await self.page.wait_for_selector(selector, timeout=self.timeout)
         await self.page.dblclick(selector)
         # Wait for navigation and get the new page content
         await self.page.wait_for_load_state('networkidle')
@@ -82,108 +93,226 @@ class CommandHandler:
 
     async def drag_and_drop(self, source, target):
         logger.info(f'Dragging element {source} to {target}')
-        await self.page.wait_for_selector(source, timeout=10000)
-        await self.page.wait_for_selector(target, timeout=10000)
+        await self.page.wait_for_selector(source, timeout=self.timeout)
+        await self.page.wait_for_selector(target, timeout=self.timeout)
         await self.page.drag_and_drop(source, target)
 
     async def mouse_over_element(self, selector):
         logger.info(f'Mouse over element: {selector}')
-        await self.page.wait_for_selector(selector, timeout=10000)
+        await self.page.wait_for_selector(selector, timeout=self.timeout)
         await self.page.hover(selector)
 
     async def set_window_size(self, width, height):
         logger.info(f'Setting window size to: {width}x{height}')
         await self.page.set_viewport_size({"width": int(width), "height": int(height)})
 
-    async def handle_if_statement(self, condition):
-        match = re.match(r'element present "(.+?)"', condition)
-        if match:
-            selector = match.group(1)
-            logger.info(f'Checking condition if element is present: {selector}')
-            return await self.page.locator(selector).count() > 0
-        return False
+    async def element_present(self, selector):
+        logger.info(f'Checking condition if element is present: {selector}')
+        return await self.page.locator(selector).count() > 0
 
-    async def handle_repeat_statement(self, condition, repeat_count):
-        match = re.match(r'element not present "(.+?)"', condition)
-        if match:
-            selector = match.group(1)
-            for i in range(int(repeat_count)):
-                logger.info(f'Checking repeat condition if element is not present: {selector}, attempt {i + 1}')
-                if await self.page.locator(selector).count() == 0:
-                    return True
-                await self.page.wait_for_timeout(2000)
-        return False
+    async def wait_element_not_present(self, selector, repeat_count):
+        # Returns as soon as the element is gone, giving up after repeat_count * 2 s
+        logger.info(f'Waiting up to {repeat_count} x 2 s for element to disappear: {selector}')
+        if int(repeat_count) == 0:
+            return False   # timeout=0 would mean no timeout at all in Playwright
+        try:
+            await self.page.locator(selector).first.wait_for(state='detached', timeout=int(repeat_count) * 2000)
+            return True
+        except PlaywrightTimeoutError:
+            return False
 
     async def get_element_content(self, selector):
         print(f'Getting content of element: {selector}')
-        await self.page.wait_for_selector(selector, timeout=10000)
+        await self.page.wait_for_selector(selector, timeout=self.timeout)
         element_content = await self.page.locator(selector).inner_html()
         print(f'Content of element {selector}: {element_content[:200]}...')  # Log a portion of the content for debugging
         return element_content
         
 
+COMMAND_REGISTRY = [(re.compile(pattern), getattr(CommandHandler, method_name)) for pattern, method_name in [
+    (r'check-element-exists "(.+?)"', 'check_element_exists'),
+    (r'fill "(.+?)" with "(.+?)"', 'fill_input'),
+    (r'click "(.+?)"', 'click_element'),
+    (r'check-text "(.+?)" is-present', 'check_text_present'),
+    (r'assert title "(.+?)"', 'assert_title'),
+    (r'assert element present "(.+?)"', 'assert_element_present'),
+    (r'assert element not present "(.+?)"', 'assert_element_not_present'),
+    (r'pause', 'pause_execution'),
+    (r'click at "(.+?)" "(.+?)"', 'click_at_coordinates'),
+    (r'double click "(.+?)"', 'double_click_element'),
+    (r'drag and drop "(.+?)" to "(.+?)"', 'drag_and_drop'),
+    (r'mouse over "(.+?)"', 'mouse_over_element'),
+    (r'set window size "(.+?)" "(.+?)"', 'set_window_size'),
+    (r'repeat if element not present "(.+?)" (\d+) times', 'wait_element_not_present'),
+]]
+
+CONDITION_REGISTRY = [(re.compile(pattern), getattr(CommandHandler, method_name)) for pattern, method_name in [
+    (r'element present "(.+?)"', 'element_present'),
+]]
+
+# op is 'call' (run handler), 'if' (run handler, jump to target when it returns False),
+# 'login' (jump to target when the session was restored) or 'save_session' (end of the login block)
+Instruction = namedtuple('Instruction', 'op handler args target line')
+
+class DSLSyntaxError(ValueError):
+    pass
+
+class Program:
+    def __init__(self, instructions, error=None):
+        self.instructions = instructions
+        self.error        = error
+        self.has_login    = any(instruction.op == 'login' for instruction in instructions)
+
+def resolve(registry, text):
+    for pattern, handler in registry:
+        match = pattern.fullmatch(text)
+        if match:
+            return handler, match.groups()
+    return None, None
+
+def compile_script(script):
+    """
+    Compile a DSL script into a flat instruction list: every line is matched once
+    against the registries and bound to its CommandHandler method, and every `if`
+    gets the index of the instruction following its own `end` (blocks nest).
+    One top-level `login` ... `end login` block may hold the login steps: they are
+    skipped while the sensor has a saved session (see monitor.sessions).
+    Syntax errors end up in Program.error instead of being raised.
+    """
+    instructions, blocks = [], []
+    try:
+        for number, line in enumerate((script or '').splitlines(), start=1):
+            command = line.strip()
+            if not command:
+                continue
+            if command.startswith('if '):
+                handler, args = resolve(CONDITION_REGISTRY, command[3:])
+                if handler is None:
+                    raise DSLSyntaxError(f'Line {number}: unknown condition "{command[3:]}"')
+                blocks.append(len(instructions))
+                instructions.append(Instruction('if', handler, args, None, number))
+            elif command == 'end':
+                if not blocks or instructions[blocks[-1]].op != 'if':
+                    raise DSLSyntaxError(f'Line {number}: "end" without "if"')
+                start               = blocks.pop()
+                instructions[start] = instructions[start]._replace(target=len(instructions))
+            elif command == 'login':
+                if blocks or any(instruction.op == 'login' for instruction in instructions):
+                    raise DSLSyntaxError(f'Line {number}: only one "login" block is allowed, outside of any "if"')
+                blocks.append(len(instructions))
+                instructions.append(Instruction('login', None, (), None, number))
+            elif command == 'end login':
+                if not blocks or instructions[blocks[-1]].op != 'login':
+                    raise DSLSyntaxError(f'Line {number}: "end login" without "login"')
+                instructions.append(Instruction('save_session', None, (), None, number))
+                start               = blocks.pop()
+                instructions[start] = instructions[start]._replace(target=len(instructions))
+            else:
+                handler, args = resolve(COMMAND_REGISTRY, command)
+                if handler is None:
+                    raise DSLSyntaxError(f'Line {number}: unknown command "{command}"')
+                instructions.append(Instruction('call', handler, args, None, number))
+        if blocks:
+            opened = instructions[blocks[-1]]
+            raise DSLSyntaxError(f'Line {opened.line}: "{opened.op}" without "{"end" if opened.op == "if" else "end login"}"')
+    except DSLSyntaxError as exc:
+        return Program([], exc)
+    return Program(instructions)
+
+# Worker-local cache: sha256 of the script -> Program, least recently used first
+_programs = OrderedDict()
+
+def get_program(script):
+    digest = hashlib.sha256((script or '').encode()).hexdigest()
+    if digest in _programs:
+        _programs.move_to_end(digest)
+    else:
+        _programs[digest] = compile_script(script)
+        while len(_programs) > settings.DSL_CACHE_SIZE:
+            _programs.popitem(last=False)
+    return _programs[digest]
+
 class DSLExecutor:
-    def __init__(self, action):
-        self.action           = action
-        self.commands         = action.selenium_script
-        self.command_registry = [
-            (r'check-element-exists "(.+?)"', 'check_element_exists'),
-            (r'fill "(.+?)" with "(.+?)"', 'fill_input'),
-            (r'click "(.+?)"', 'click_element'),
-            (r'check-text "(.+?)" is-present', 'check_text_present'),
-            (r'assert title "(.+?)"', 'assert_title'),
-            (r'assert element present "(.+?)"', 'assert_element_present'),
-            (r'assert element not present "(.+?)"', 'assert_element_not_present'),
-            (r'pause', 'pause_execution'),
-            (r'click at "(.+?)" "(.+?)"', 'click_at_coordinates'),
-            (r'double click "(.+?)"', 'double_click_element'),
-            (r'drag and drop "(.+?)" to "(.+?)"', 'drag_and_drop'),
-            (r'mouse over "(.+?)"', 'mouse_over_element'),
-            (r'set window size "(.+?)" "(.+?)"', 'set_window_size'),
-        ]
+    def __init__(self, action, program=None, block=None):
+        self.action  = action
+        self.program = program or get_program(action.selenium_script)
+        self.block   = block or block_policy(action)
+        self.meter   = PageMeter(action.block_policy if self.block else 'none')   # per-navigation browser metrics, saved with the TestResult
+
+    async def new_page(self, context):
+        if self.block:
+            await context.route('**/*', self.block.route)
+        return await context.new_page()
 
     async def screenshot(self):
         logger.info(f'Trying to take a Screenshot.....')
-        DATA_DIR = settings.DATA_DIR
         testResult = TestResult(
             action         = self.action,
             test_type      = self.action.assertion_type,
             expected_value = 'pass',
             timestamp      = timezone.now(),
         )
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
+        async with browser_context(viewport={"width": 1000, "height": 1000}) as context:
             try:
-                browser     = await p.chromium.launch()
-                page        = await browser.new_page()
-                await page.set_viewport_size({"width": 1000, "height": 1000})
+                await self.meter.install(context)
+                page        = await self.new_page(context)
                 sensor_url  = self.action.sensor.url
                 action_path = self.action.action_path      
                           
                 await page.goto(sensor_url + action_path)
-                user_id         = await sync_to_async(lambda: self.action.sensor.user.id)()
-                filename        = f"{self.action.id}_{user_id}_{timezone.now().strftime('%Y%m%d%H%M%S')}.jpg"
-                screenshot_path = os.path.join(DATA_DIR, filename)
-                                
-                await page.screenshot(path=screenshot_path)
-                # Resize the image using Pillow
-                img = Image.open(screenshot_path)
-                img = img.resize((500, 500), Image.LANCZOS)  # Resize to 250x250
-                img.save(screenshot_path, quality=50)  # Save with lower quality                
-                await browser.close()
+                await self.meter.measure(page)
+                # Capture in memory; resize, encode, hash and store in the screenshot thread pool
+                capture  = await screenshots.store(await page.screenshot())
+                previous = await sync_to_async(self.action.screenshots.order_by('-timestamp').first)()
+                await sync_to_async(Screenshot.objects.create)(
+                    action    = self.action,
+                    digest    = capture.digest,
+                    extension = screenshots.extension(),
+                    size      = capture.size,
+                    dhash     = capture.dhash,
+                    thumb     = capture.thumb,
+                )
                 testResult.actual_value = 'pass'
-                testResult.body           = filename
-                logger.info(f'Screenshot saved at: {screenshot_path}')
+                testResult.body           = os.path.relpath(capture.path, settings.DATA_DIR)
+                logger.info(f'Screenshot saved at: {capture.path}')
+                if previous and previous.thumb:
+                    self.compare(testResult, previous, capture)
             except Exception as exc:
                 logger.error(f'Screenshot failed: {exc}')
                 logger.error(traceback.format_exc())
                 testResult.actual_value = 'fail'
                 testResult.body           = exc
-            finally:
-                await browser.close()
                 
         return testResult
                 
+    def compare(self, testResult, previous, capture):
+        # Identical blobs did not change; otherwise diff the thumbnails (a 64x64 NumPy diff, microseconds)
+        score     = 0.0 if previous.digest == capture.digest else screenshots.change_score(bytes(previous.thumb), capture.thumb)
+        distance  = screenshots.hash_distance(previous.dhash, capture.dhash) if previous.dhash else None
+        threshold = self.action.diff_threshold
+        testResult.change_score = score
+        logger.info(f'Screenshot changed {score:.1%} (hash distance {distance})')
+        if threshold is not None and score > threshold:
+            testResult.actual_value = 'fail'
+            testResult.body         = f'Changed {score:.1%} (threshold {threshold:.1%}, hash distance {distance})'
+
+    async def page_text(self, page):
+        # The browser already has the text: no need to serialize and parse the whole page
+        try:
+            text = await page.evaluate("() => document.body ? document.body.innerText.slice(0, 300) : ''")
+            return re.sub(r'\s+', ' ', text).strip()
+        except Exception as exc:
+            return str(exc)[:255]
+
+    async def save_trace(self, context, timestamp):
+        try:
+            path = traces.new_trace_path(self.action.id, timestamp)
+            await context.tracing.stop(path=path)
+            traces.rotate(self.action.id)
+            logger.info(f'Trace saved at: {path}')
+        except Exception as exc:
+            logger.error(f'Could not save trace: {exc}')
+
     async def execute(self):
         # Store the result in TestResult model
         testResult = TestResult(
@@ -193,10 +322,40 @@ class DSLExecutor:
             expected_value = 'pass',
             timestamp=timezone.now()
         )        
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page    = await browser.new_page()
-            handler = CommandHandler(page)
+        if self.program.error:
+            testResult.body = str(self.program.error)[:255]
+            return testResult
+        if self.action.engine == 'static' and not static_dsl.supports(self.program):
+            testResult.body = 'This script needs the browser engine: only presence, text and title checks with CSS selectors run without it'
+            return testResult
+        static = self.action.engine == 'static' or (self.action.engine == 'auto' and static_dsl.conclusive(self.program))
+        if static and static_dsl.supports(self.program):
+            staticResult = await static_dsl.execute(self.action, self.program)
+            if staticResult.actual_value == 'pass' or self.action.engine == 'static':
+                return staticResult
+            # Auto: the content may only appear once scripts ran, confirm the failure in the browser
+            logger.info('Static check failed, running it again in the browser')
+        # Start from the sensor's saved session, if the script has login steps to skip
+        session = await sync_to_async(load_session)(self.action.sensor_id) if self.program.has_login else None
+        if session:
+            await self.run_in_browser(testResult, session, trace=False)
+            if testResult.actual_value == 'pass':
+                return testResult
+            # The saved session may have expired on the target side: log in again before reporting a failure
+            logger.info('Run from the saved session failed, running it again with the login steps')
+            await sync_to_async(drop_session)(self.action.sensor_id)
+            self.meter      = PageMeter(self.meter.block_policy)   # only the metrics of the run reported
+            testResult.body = None
+        return await self.run_in_browser(testResult)
+
+    async def run_in_browser(self, testResult, session=None, trace=True):
+        async with browser_context(storage_state=session) as context:
+            if trace and settings.BROWSER_TRACE:
+                # DOM snapshots and network only (no screencast); dropped with the context unless the run fails
+                await context.tracing.start(snapshots=True, screenshots=False)
+            await self.meter.install(context)
+            page    = await self.new_page(context)
+            handler = CommandHandler(page, self.action.wait_timeout)
 
             # Automatically open the URL using sensor and action path
             sensor_url  = self.action.sensor.url
@@ -204,60 +363,40 @@ class DSLExecutor:
             start_url   = f"{sensor_url}{action_path}"
             logger.info(f'Opening start URL: {start_url}')
 
-            await page.goto(start_url, timeout=10000)
-
-            commands = self.commands.splitlines()
-            i = 0
-            while i < len(commands):
-                command = commands[i].strip()
-                handled = False
-                try:
-                    # Handle if-else conditions
-                    if command.startswith('if '):
-                        condition = command[3:]
-                        if await handler.handle_if_statement(condition):
-                            i += 1
-                        else:
-                            # Skip to the corresponding 'end'
-                            while i < len(commands) and not commands[i].startswith('end'):
-                                i += 1
-                    elif command.startswith('repeat if '):
-                        condition, repeat_count = re.match(r'repeat if (.+?) (\d+) times', command).groups()
-                        if await handler.handle_repeat_statement(condition, repeat_count):
-                            i += 1
-                        else:
-                            # Skip to the next command if condition is not met
-                            i += 1
-
-                    elif command == 'end':
-                        # End of an if block
-                        i += 1
+            instructions = self.program.instructions
+            pc = 0
+            try:
+                await page.goto(start_url, timeout=10000)
+                await self.meter.measure(page)
 
+                while pc < len(instructions):
+                    instruction = instructions[pc]
+                    if instruction.op == 'login':
+                        # Already authenticated: skip the login steps
+                        pc = instruction.target if session else pc + 1
+                        continue
+                    if instruction.op == 'save_session':
+                        await sync_to_async(save_session)(self.action.sensor_id, await context.storage_state())
+                        pc += 1
+                        continue
+                    result = await instruction.handler(handler, *instruction.args)
+                    if instruction.handler.__name__ in NAVIGATION_COMMANDS:
+                        await self.meter.measure(page, instruction.handler.__name__, instruction.line)
+                    if instruction.op == 'if' and not result:
+                        # Skip to the instruction after the matching 'end'
+                        pc = instruction.target
                     else:
-                        # Regular command handling
-                        for pattern, method_name in self.command_registry:
-                            match = re.match(pattern, command)
-                            if match:
-                                method = getattr(handler, method_name)
-                                await method(*match.groups())
-                                handled = True
-                                break
-                        if not handled:
-                            logger.info(f'Unknown command: {command}')
-                        i += 1
-
-                except Exception as e:
-                    logger.error(f'Error occurred: {str(e)}')
-                    page_content     = await page.content()
-                    soup             = BeautifulSoup(page_content, 'html.parser')
-                    clean_text       = re.sub(r'\s+', ' ', soup.get_text()[:300]).strip()
-                    
-                    testResult.actual_value = 'fail'
-                    testResult.body         = clean_text  # Store part of the page content without HTML tags
-                    await browser.close()
-                    return testResult
+                        pc += 1
+
+            except Exception as e:
+                logger.error(f'Error occurred: {str(e)}')
+                testResult.actual_value = 'fail'
+                # Store part of the page content without HTML tags, or the error when the start page did not load
+                testResult.body         = await self.page_text(page) or str(e)[:255]
+                if trace and settings.BROWSER_TRACE:
+                    await self.save_trace(context, testResult.timestamp)
+                return testResult
             
             testResult.actual_value = 'pass'
-            await browser.close()
             return testResult
 
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Action, Sensor, TestResult
+from .blocking import validate_block_rules
+from .models import Action, PageMetric, Sensor, TestResult
 from django.db.models import Count
 
 class SensorSerializer(serializers.ModelSerializer):
@@ -35,6 +36,12 @@ class ActionSerializer(serializers.ModelSerializer):
         else:
             self.fields['sensor'] = SensorSerializer()
 
+    def validate_block_rules(self, value):
+        try:
+            return validate_block_rules(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+
     def get_latest_test_result(self, obj):
         # Get the latest test result for the action using timestamp
         latest_test = obj.tests.order_by('-timestamp').first()
@@ -42,7 +49,23 @@ class ActionSerializer(serializers.ModelSerializer):
             return TestResultSerializer(latest_test).data
         return None
     
+# test_type of the results written by DSLExecutor
+BROWSER_TEST_TYPES = {'script_execution', 'screenshot'}
+
+class PageMetricSerializer(serializers.ModelSerializer):
+    class Meta:
+        model   = PageMetric
+        exclude = ['result']
+
 class TestResultSerializer(serializers.ModelSerializer):
+    page_metrics = serializers.SerializerMethodField()
+
     class Meta:
         model = TestResult
         fields = '__all__'
+
+    def get_page_metrics(self, obj):
+        # Browser checks only: HTTP checks and unsaved results never have any, so no query for them
+        if obj.pk is None or obj.test_type not in BROWSER_TEST_TYPES:
+            return []
+        return PageMetricSerializer(obj.page_metrics.all(), many=True).data
@@ -0,0 +1,24 @@
+from .models import SensorSession
+from django.conf import settings
+from django.utils import timezone
+
+import json
+import logging
+
+logger = logging.getLogger('celery_process')
+
+def load_session(sensor_id):
+    """Saved Playwright storage_state of the sensor, or None when there is none or it expired."""
+    session = SensorSession.objects.filter(sensor_id=sensor_id, expires_at__gt=timezone.now()).first()
+    return json.loads(session.state) if session else None
+
+def save_session(sensor_id, state):
+    SensorSession.objects.update_or_create(
+        sensor_id = sensor_id,
+        defaults  = {'state': json.dumps(state), 'expires_at': timezone.now() + settings.BROWSER_SESSION_TTL},
+    )
+    logger.info(f'Browser session of sensor {sensor_id} saved')
+
+def drop_session(sensor_id):
+    # The next run logs in again
+    SensorSession.objects.filter(sensor_id=sensor_id).delete()
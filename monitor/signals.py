@@ -0,0 +1,41 @@
+from . import plans
+from .models import Action, Sensor
+from .scheduler import publish_schedule_event, sync_sensor_actions
+from .sessions import drop_session
+from .tasks import refresh_favicon
+from .traces import drop_traces
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+@receiver(pre_save, sender=Sensor)
+def sensor_url_changed(sender, instance, **kwargs):
+    # A new URL means a new favicon: mark it for lookup, and a new site to log in to
+    if instance.pk and Sensor.objects.filter(pk=instance.pk).exclude(url=instance.url).exists():
+        instance.favico_checked_at = None
+        drop_session(instance.pk)
+
+@receiver(post_save, sender=Sensor)
+def sensor_saved(sender, instance, created, **kwargs):
+    if instance.favico_checked_at is None:
+        transaction.on_commit(lambda: refresh_favicon.delay(instance.id))
+    # Keep Action.next_run_at in sync with Sensor.frequency
+    if not created:
+        sync_sensor_actions(instance)
+        publish_schedule_event(sensor=instance.id)
+        # The URL is part of the check plans: give them a new version
+        actions = Action.objects.filter(sensor=instance)
+        plans.invalidate(*actions.values_list('id', flat=True))
+        actions.update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Action)
+def action_saved(sender, instance, **kwargs):
+    plans.invalidate(instance.id)
+    publish_schedule_event(action=instance.id)
+
+@receiver(post_delete, sender=Action)
+def action_deleted(sender, instance, **kwargs):
+    plans.invalidate(instance.id)
+    publish_schedule_event(action=instance.id, deleted=True)
+    drop_traces(instance.id)
@@ -0,0 +1,135 @@
+from .http import check_timeout, get_session, read_body
+from .models import TestResult
+from bs4 import BeautifulSoup
+from django.utils import timezone
+
+import logging
+import re
+import soupsieve
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+logger = logging.getLogger('celery_process')
+
+# CommandHandler methods the static engine can evaluate on server-rendered HTML, and their selector argument
+STATIC_COMMANDS = {
+    'check_element_exists'      : 0,
+    'assert_element_present'    : 0,
+    'assert_element_not_present': 0,
+    'element_present'           : 0,
+    'check_text_present'        : None,
+    'assert_title'              : None,
+}
+
+# Text Playwright's text= selector never matches
+HIDDEN_TAGS = {'script', 'style', 'template', 'noscript', 'head', 'title'}
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+def supports(program):
+    """
+    True when every instruction of the compiled program has a static twin and every
+    selector is plain CSS (Playwright-only syntax such as text=, xpath or >> needs the
+    browser). Cached on the program.
+    """
+    if not hasattr(program, 'static'):
+        program.static = not program.error and not program.has_login and all(
+            instruction.op in ('call', 'if') and instruction.handler.__name__ in STATIC_COMMANDS and is_css(instruction)
+            for instruction in program.instructions
+        )
+    return program.static
+
+# Checks a script may add to the page later, whose static result the browser could contradict
+NON_MONOTONIC = {'assert_element_not_present', 'element_present'}
+
+def conclusive(program):
+    """
+    True when a static pass can be trusted: the program only asserts that elements, text
+    and title are there. An absent element or a false `if` may still come from JavaScript.
+    """
+    return all(instruction.op not in ('call', 'if') or instruction.handler.__name__ not in NON_MONOTONIC for instruction in program.instructions)
+
+def is_css(instruction):
+    position = STATIC_COMMANDS[instruction.handler.__name__]
+    if position is None:
+        return True
+    try:
+        soupsieve.compile(instruction.args[position])
+        return True
+    except Exception:
+        return False
+
+class StaticHandler:
+    """The browser-free twins of the CommandHandler checks, evaluated on the fetched HTML."""
+    def __init__(self, soup):
+        self.soup = soup
+        self.text = None
+
+    async def check_element_exists(self, selector):
+        logger.info(f'Checking if element exists: {selector}')
+        assert self.soup.select_one(selector) is not None, f"Element {selector} not found"
+
+    async def assert_element_present(self, selector):
+        logger.info(f'Asserting element is present: {selector}')
+        assert self.soup.select_one(selector) is not None, f"Element {selector} not found"
+
+    async def assert_element_not_present(self, selector):
+        logger.info(f'Asserting element is not present: {selector}')
+        assert self.soup.select_one(selector) is None, f"Element {selector} is present"
+
+    async def element_present(self, selector):
+        logger.info(f'Checking condition if element is present: {selector}')
+        return self.soup.select_one(selector) is not None
+
+    async def check_text_present(self, text):
+        # Like Playwright's text= selector: case-insensitive, whitespace-normalized substring
+        logger.info(f'Checking if text is present: {text}')
+        if self.text is None:
+            strings   = (string for string in self.soup.find_all(string=True) if string.parent.name not in HIDDEN_TAGS)
+            self.text = normalize(''.join(strings)).lower()
+        assert normalize(text).lower() in self.text, f"Text '{text}' not found on page"
+
+    async def assert_title(self, expected_title):
+        logger.info(f'Asserting title is: {expected_title}')
+        title = normalize(self.soup.title.get_text()) if self.soup.title else ''
+        assert title == normalize(expected_title), f"Title does not match: {expected_title}"
+
+async def execute(action, program):
+    """Run a supported program on the page fetched with the shared aiohttp session."""
+    testResult = TestResult(
+        action         = action,
+        test_type      = 'script_execution',
+        actual_value   = 'fail',
+        expected_value = 'pass',
+        timestamp      = timezone.now()
+    )
+    start_url = f"{action.sensor.url}{action.action_path}"
+    logger.info(f'Fetching start URL without a browser: {start_url}')
+    try:
+        async with get_session().get(start_url, timeout=check_timeout(action.sensor.frequency)) as response:
+            html = await read_body(response)
+        soup = BeautifulSoup(html, HTML_PARSER)
+    except Exception as exc:
+        logger.error(f'Error occurred: {exc}')
+        testResult.body = str(exc)[:255]
+        return testResult
+
+    handler = StaticHandler(soup)
+    pc      = 0
+    while pc < len(program.instructions):
+        instruction = program.instructions[pc]
+        try:
+            result = await getattr(handler, instruction.handler.__name__)(*instruction.args)
+        except AssertionError as exc:
+            logger.error(f'Error occurred: {exc}')
+            testResult.body = normalize(soup.get_text()[:300])
+            return testResult
+        pc = instruction.target if instruction.op == 'if' and not result else pc + 1
+
+    testResult.actual_value = 'pass'
+    return testResult
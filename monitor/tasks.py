@@ -1,9 +1,16 @@
+from . import inflight, metrics, screenshots
+from .browser_pool import close_browser_pool
+from .http import RequestTimings, close_pool, discard_body, get_loop, get_session, open_pool, stream_contains, stream_json_path
 from .models import Action, TestResult, Sensor, UserProfile
+from .plans import get_plans
+from .scheduler import DispatchLimiter, claim_due_actions
 from .selenium_dsl import DSLExecutor
 from .serializers import TestResultSerializer
 from asgiref.sync import sync_to_async
 from bs4 import BeautifulSoup
 from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
+from celery.utils import uuid
 from celery.schedules import timedelta
 from django_celery_results.models import TaskResult
 from django.conf import settings
@@ -13,7 +20,6 @@ from django.db.models import Q
 
 import aiohttp
 import asyncio
-import json
 import logging
 import os
 import re
@@ -21,6 +27,20 @@ import traceback
 
 logger = logging.getLogger('celery_process')
 
+# Assertions checked with a plain HTTP request, batched by run_http_actions
+HTTP_ASSERTIONS = ['status_code', 'contains_keyword', 'json_key_exists']
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # Each worker process keeps one event loop and one pooled HTTP session for its whole life
+    open_pool()
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    # The browser pool is launched lazily by the first browser check and runs on the same loop
+    close_browser_pool()
+    close_pool()
+
 def should_send_notification(current_test_result):
     # Fetch the last test result for the same action before the current one
     previous_test_result = TestResult.objects.filter(
@@ -50,12 +70,12 @@ def should_send_notification(current_test_result):
 # Async function to send a message via Telegram using aiohttp
 async def send_telegram_message(bot_token, chat_ids, message):
     telegram_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    async with aiohttp.ClientSession() as session:
-        for chat_id in chat_ids:
-            payload = {'chat_id': chat_id,'text': message}
-            async with session.post(telegram_url, json=payload) as response:
-                if response.status != 200:
-                    print(f"Failed to send message to chat_id: {chat_id}. Status: {response.status}")
+    session      = get_session()
+    for chat_id in chat_ids:
+        payload = {'chat_id': chat_id,'text': message}
+        async with session.post(telegram_url, json=payload) as response:
+            if response.status != 200:
+                print(f"Failed to send message to chat_id: {chat_id}. Status: {response.status}")
 
 async def get_favicon(url):
     try:
@@ -63,72 +83,146 @@ async def get_favicon(url):
         parsed_url = url.split("/")
         base_url = f"{parsed_url[0]}//{parsed_url[2]}"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(base_url) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to fetch page, status code: {response.status}")
+        session = get_session()
+        timeout = aiohttp.ClientTimeout(total=settings.FAVICON_TIMEOUT)
+        async with session.get(base_url, timeout=timeout) as response:
+            if response.status != 200:
+                logger.error(f"Failed to fetch page, status code: {response.status}")
+                return None
+            
+            html_content = await response.text()
+            soup = BeautifulSoup(html_content, 'html.parser')
+            icon_link = None
+            
+            # Search for favicon link elements
+            for link in soup.find_all('link'):
+                rel = link.get('rel', [])
+                if 'icon' in rel or 'shortcut icon' in rel:
+                    icon_link = link.get('href')
+                    break
+            
+            # Fallback to /favicon.ico if no link was found
+            if not icon_link:
+                icon_link = "/favicon.ico"
+            
+            # Construct the full URL if needed
+            if icon_link and not icon_link.startswith("http"):
+                icon_link = base_url.rstrip('/') + icon_link if icon_link.startswith("/") else f"{base_url.rstrip('/')}/{icon_link}"
+            
+            # Verify if the favicon link is accessible
+            async with session.get(icon_link, timeout=timeout) as icon_response:
+                if icon_response.status == 200:
+                    logger.info(f"Favicon URL: {icon_link}")
+                    return icon_link
+                else:
+                    logger.error(f"Favicon not found at: {icon_link}")
                     return None
-                
-                html_content = await response.text()
-                soup = BeautifulSoup(html_content, 'html.parser')
-                icon_link = None
-                
-                # Search for favicon link elements
-                for link in soup.find_all('link'):
-                    rel = link.get('rel', [])
-                    if 'icon' in rel or 'shortcut icon' in rel:
-                        icon_link = link.get('href')
-                        break
-                
-                # Fallback to /favicon.ico if no link was found
-                if not icon_link:
-                    icon_link = "/favicon.ico"
-                
-                # Construct the full URL if needed
-                if icon_link and not icon_link.startswith("http"):
-                    icon_link = base_url.rstrip('/') + icon_link if icon_link.startswith("/") else f"{base_url.rstrip('/')}/{icon_link}"
-                
-                # Verify if the favicon link is accessible
-                async with session.get(icon_link) as icon_response:
-                    if icon_response.status == 200:
-                        logger.info(f"Favicon URL: {icon_link}")
-                        return icon_link
-                    else:
-                        logger.error(f"Favicon not found at: {icon_link}")
-                        return None
     except Exception as e:
         logger.error(f"Error while fetching favicon: {str(e)}")
         return None
 
+@shared_task()
+def refresh_favicon(sensor_id):
+    # Favicon discovery lives off the check path: run on URL change and once every FAVICON_TTL
+    sensor = Sensor.objects.filter(id=sensor_id).first()
+    if not sensor:
+        return None
+    favico  = get_loop().run_until_complete(get_favicon(sensor.url))
+    updates = {'favico_checked_at': timezone.now()}
+    if favico:
+        updates['favico'] = favico
+    # update() rather than save(): a favicon is not a schedule change
+    Sensor.objects.filter(id=sensor_id).update(**updates)
+    return favico
+
+@shared_task()
+def refresh_stale_favicons():
+    stale = Sensor.objects.filter(Q(favico_checked_at__isnull=True) | Q(favico_checked_at__lt=timezone.now() - settings.FAVICON_TTL))
+    for sensor_id in stale.values_list('id', flat=True):
+        refresh_favicon.delay(sensor_id)
+
+@shared_task()
+def prune_screenshots():
+    rows, files = screenshots.prune(timezone.now() - settings.SCREENSHOT_RETENTION)
+    logger.info(f'Pruned {rows} screenshots and {files} files')
+
 @shared_task()
 def delete_old_task_results():
     delta = timezone.now() - timedelta(minutes=15)
     TaskResult.objects.filter(date_done__lt=delta).delete()
 
+dispatch_limiter = DispatchLimiter(settings.SCHEDULER_DISPATCH_RATE, settings.SCHEDULER_DISPATCH_BURST)
+
+def dispatch_actions(claimed, now=None):
+    """
+    Queue a check for every claimed action at its due time, smoothed by the dispatch limiter.
+    Lightweight HTTP checks due in the same second are grouped into run_http_actions batches.
+    Actions whose previous run is still in flight are skipped: that slot is coalesced into the running check.
+    """
+    now     = (now or timezone.now()).timestamp()
+    batches = {}
+    queued  = []
+    for action_id, due, assertion_type in claimed:
+        countdown = max(dispatch_limiter.reserve(max(due.timestamp(), now)) - now, 0)
+        if assertion_type in HTTP_ASSERTIONS:
+            batch = batches.setdefault(int(countdown), [[]])
+            if len(batch[-1]) >= settings.HTTP_BATCH_SIZE:
+                batch.append([])
+            batch[-1].append(action_id)
+        else:
+            queued.append((run_playwright_action, [action_id], countdown))
+    for countdown, batch in batches.items():
+        queued.extend((run_http_actions, action_ids, countdown) for action_ids in batch)
+
+    dispatched = skipped = 0
+    for task, action_ids, countdown in queued:
+        task_id = uuid()
+        busy    = inflight.acquire({action_id: task_id for action_id in action_ids})
+        if busy:
+            logger.info(f'Actions {busy} still running, skipping this run')
+            skipped   += len(busy)
+            action_ids = [action_id for action_id in action_ids if action_id not in busy]
+            if not action_ids:
+                continue
+        args = (action_ids,) if task is run_http_actions else (action_ids[0],)
+        try:
+            if countdown > 0:
+                task.apply_async(args, task_id=task_id, countdown=countdown)
+            else:
+                task.apply_async(args, task_id=task_id)
+        except Exception:
+            for action_id in action_ids:
+                inflight.release(action_id, task_id)
+            raise
+        dispatched += len(action_ids)
+    if skipped:
+        metrics.incr('dispatch_skipped_inflight', skipped)
+    metrics.incr('dispatched', dispatched)
+
 @shared_task(bind=True)
 def schedule_sensor_actions(self):
-    now = timezone.now()
-    sensors = Sensor.objects.all()
+    now       = timezone.now()
+    horizon   = now + timedelta(seconds=settings.SCHEDULER_BEAT_INTERVAL)
     processed = []
-    for sensor in sensors:
-        threshold = now - timedelta(seconds=sensor.frequency)
-        actions   = Action.objects.filter(sensor=sensor, last_execution__lt=threshold)
-        logger.info(f'PROCESSING SENSOR >{sensor.name}< - {threshold} seconds')
-        for action in actions:
-            # Schedule the task to run Playwright for this action
-            processed.append(action.id)
-            run_playwright_action.delay(action.id)
-            action.last_execution = timezone.now()
-            action.save()
+    while True:
+        # Claim everything due before the next tick and release each action at its own slot,
+        # so the workers get a steady stream instead of one burst per tick
+        claimed = claim_due_actions(now, horizon=horizon)
+        dispatch_actions(claimed, now)
+        processed.extend(action_id for action_id, _, _ in claimed)
+        if len(claimed) < settings.SCHEDULER_BATCH_SIZE:
+            break
+    logger.info(f'SCHEDULED {len(processed)} actions')
     return processed
 
-@shared_task(bind=True)
-def run_playwright_action(self, action_id):
-    loop        = asyncio.get_event_loop()
-    test_result = loop.run_until_complete(async_run_playwright_action(action_id))
-    logger.info(f"test_result --------- {test_result}")
-    
-    test_result_db = TestResult.objects.get(id=test_result['id'])
+@shared_task()
+def send_notifications(test_result_ids):
+    # Runs on the notify queue: the checks never wait for the database lookups or Telegram
+    loop = get_loop()
+    for test_result in TestResult.objects.select_related('action__sensor').filter(id__in=test_result_ids).order_by('timestamp'):
+        notify_on_change(test_result, loop)
+
+def notify_on_change(test_result_db, loop):
     if should_send_notification(test_result_db):
         # Check if test failed
         if test_result_db.expected_value != test_result_db.actual_value or test_result_db.actual_value == 'fail':
@@ -140,70 +234,142 @@ def run_playwright_action(self, action_id):
             if user_profile.telegram_chat_ids:
                 loop.run_until_complete(send_telegram_message(settings.BOT_TOKEN, user_profile.telegram_chat_ids, message))
 
+@shared_task(bind=True)
+def run_playwright_action(self, action_id):
+    loop = get_loop()
+    try:
+        test_result = loop.run_until_complete(async_run_playwright_action(action_id))
+    finally:
+        inflight.release(action_id, self.request.id)
+        if self.request.called_directly:
+            # "Run now" from a web worker: no worker_process_shutdown there to close the browser
+            close_browser_pool()
+    logger.info(f"test_result --------- {test_result}")
+    
+    if test_result['id']:
+        send_notifications.delay([test_result['id']])
+    return test_result
+
+@shared_task(bind=True)
+def run_http_actions(self, action_ids):
+    # Run a batch of lightweight HTTP checks concurrently on one event loop and store the results in bulk
+    loop = get_loop()
+    try:
+        test_results = loop.run_until_complete(async_run_http_actions(action_ids, self.request.id))
+    except Exception:
+        for action_id in action_ids:
+            inflight.release(action_id, self.request.id)
+        raise
+    TestResult.objects.bulk_create(test_results)
+    logger.info(f"run_http_actions --------- {len(test_results)} checks")
+
+    if test_results:
+        send_notifications.delay([test_result.id for test_result in test_results])
+    return TestResultSerializer(test_results, many=True).data
+
+async def async_run_http_actions(action_ids, task_id=None):
+    plans     = await sync_to_async(get_plans)(action_ids)
+    semaphore = asyncio.Semaphore(settings.HTTP_BATCH_CONCURRENCY)
+    session   = get_session()
+    release   = sync_to_async(inflight.release)
+    # Deleted actions have no plan: nothing to wait for
+    for action_id in set(action_ids) - {plan.action.id for plan in plans}:
+        await release(action_id, task_id)
+
+    async def bounded_check(plan):
+        # Each action is free for its next run as soon as its own check is done, not the whole batch
+        try:
+            async with semaphore:
+                return await run_http_check(session, plan)
+        finally:
+            await release(plan.action.id, task_id)
+
+    return await asyncio.gather(*(bounded_check(plan) for plan in plans))
+
+async def run_http_check(session, plan):
+    # status_code / contains_keyword / json_key_exists checks only need aiohttp, no browser
+    action      = plan.action
+    test_result = TestResult(
+        action         = action,
+        test_type      = plan.assertion_type,
+        expected_value = plan.expected_value,
+        timestamp      = timezone.now(),
+        body           = ''
+    )        
+    timings = RequestTimings()
+    try:
+        if plan.error:
+            raise plan.error
+        async with session.request(method=plan.method, url=plan.url, headers=plan.headers, json=plan.data, trace_request_ctx=timings, timeout=plan.timeout) as response:
+            if action.assertion_type =='contains_keyword':
+                if await stream_contains(response, test_result.expected_value):
+                    test_result.actual_value = 'pass'
+                    test_result.body = f'{action.action_name} found:{test_result.expected_value}'
+                    logger.info(f'{action.action_name} found:{test_result.expected_value}')
+                else:
+                    test_result.actual_value = 'fail'
+                    test_result.body = f'{action.action_name} Not found:{test_result.expected_value}'
+                    logger.error(f'{action.action_name} Not found:{test_result.expected_value}')
+            elif action.assertion_type == 'json_key_exists':
+                try:
+                    found = await stream_json_path(response, plan.json_path)
+                    body  = f'{action.action_name} {"found" if found else "Not found"}:{test_result.expected_value}'
+                except ValueError as exc:
+                    found = False
+                    body  = f'{action.action_name} {exc}'
+                test_result.actual_value = 'pass' if found else 'fail'
+                test_result.body         = body[:255]
+                if found:
+                    logger.info(body)
+                else:
+                    logger.error(body)
+            else:
+                test_result.actual_value = str(response.status)
+                test_result.body = ''
+                logger.info(f'      {action.action_name} status_code:{str(response.status)}')
+                await discard_body(response)
+                
+    except Exception as exc:
+        test_result.actual_value = '500'
+        test_result.body         = (str(exc) or type(exc).__name__)[:255]   # a timeout has no message
+        logger.error(exc)
+        logger.error(traceback.format_exc())
+    timings.finish()
+    test_result.dns_ms     = timings.dns_ms
+    test_result.connect_ms = timings.connect_ms
+    test_result.ttfb_ms    = timings.ttfb_ms
+    test_result.total_ms   = timings.total_ms
     return test_result
 
 async def async_run_playwright_action(action_id):
-    # Fetch the action from the database using sync_to_async to avoid async context issue
-    action      = await sync_to_async(Action.objects.select_related('sensor').get)(id=action_id)
-    sensor      = action.sensor
+    # Fetch the compiled plan using sync_to_async to avoid async context issue
+    plans = await sync_to_async(get_plans)([action_id])
+    if not plans:
+        raise Action.DoesNotExist(f'Action {action_id} does not exist')
+    plan        = plans[0]
+    action      = plan.action
     test_result = None
-
-    favico = await get_favicon(sensor.url+action.action_path)
-    if favico:
-        sensor.favico = favico
-        await sync_to_async(sensor.save)() 
+    executor    = None
 
     # If the action is a simple status code check, use aiohttp for efficiency
-    if action.assertion_type in ['status_code','contains_keyword']:
-        test_result = TestResult(
-            action         = action,
-            test_type      = action.assertion_type,
-            expected_value = action.expected_value,
-            timestamp      = timezone.now(),
-            body           = ''
-        )        
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = None
-                data    = None
-                if action.payload:
-                    headers = json.loads(action.payload).get('headers', {}) if action.payload else {}
-                    data    = json.loads(action.payload).get('data'   , {}) if action.payload else {}
-                async with session.request(method=action.action_type, url=action.sensor.url + action.action_path, headers=headers, json=data) as response:
-                    if action.assertion_type =='contains_keyword':
-                        response_text = await response.text()
-                        if test_result.expected_value in response_text:
-                            test_result.actual_value = 'pass'
-                            test_result.body = f'{action.action_name} found:{test_result.expected_value}'
-                            logger.info(f'{action.action_name} found:{test_result.expected_value}')
-                        else:
-                            test_result.actual_value = 'fail'
-                            test_result.body = f'{action.action_name} Not found:{test_result.expected_value}'
-                            logger.error(f'{action.action_name} Not found:{test_result.expected_value}')
-                    else:
-                        test_result.actual_value = str(response.status)
-                        test_result.body = ''
-                        logger.info(f'      {action.action_name} status_code:{str(response.status)}')
-                        
-        except Exception as exc:
-            test_result.actual_value = '500'
-            test_result.body         = exc
-            logger.error(exc)
-            logger.error(traceback.format_exc())
+    if action.assertion_type in HTTP_ASSERTIONS:
+        test_result = await run_http_check(get_session(), plan)
 
     # Selenium Style script
     elif action.assertion_type == 'selenium':
-        executor    = DSLExecutor(action)
+        executor    = DSLExecutor(action, plan.program, plan.block)
         test_result = await executor.execute()
 
     # Playwright screenshot action
     elif action.assertion_type == 'screenshot':
         logger.info(f'Trying to take a Screenshot.....')
-        executor    = DSLExecutor(action)
+        executor    = DSLExecutor(action, block=plan.block)
         test_result = await executor.screenshot()
             
     if test_result:
         await sync_to_async(test_result.save)()
+        if executor and executor.meter.metrics:
+            await sync_to_async(executor.meter.save)(test_result)
     else:
         test_result = TestResult(
             action         = action,
@@ -1,3 +1,220 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, override_settings
+from unittest import mock
 
-# Create your tests here.
+from . import selenium_dsl
+from .jsonstream import WILDCARD, JsonPathScanner, parse_path
+from .models import Action, Sensor
+from .plans import CheckPlan
+from .selenium_dsl import DSLExecutor, compile_script
+
+import asyncio
+import contextlib
+import json
+
+def evaluate(document, steps):
+    # Reference: walk the fully parsed document
+    values = [json.loads(document)]
+    for step in steps:
+        found = []
+        for value in values:
+            if step is WILDCARD:
+                found.extend(value.values() if isinstance(value, dict) else value if isinstance(value, list) else [])
+            elif isinstance(step, str) and isinstance(value, dict) and step in value:
+                found.append(value[step])
+            elif isinstance(step, int) and isinstance(value, list) and step < len(value):
+                found.append(value[step])
+        values = found
+    return bool(values)
+
+def scan(document, path, size):
+    scanner = JsonPathScanner(path)
+    data    = document.encode()
+    for start in range(0, len(data), size):
+        if scanner.feed(data[start:start + size]):
+            return True
+    return scanner.close()
+
+DOCUMENT = json.dumps({
+    'data'    : {'items': [{'id': 1, 'tags': []}, {'id': 2, 'name': 'say "hi"\\'}], 'total': 2},
+    'a "key"' : {'x': None},
+    'empty'   : {},
+    'list'    : [[1, 2], [3, {'deep': True}]],
+    'number'  : -12.5e3,
+})
+
+class ParsePathTests(SimpleTestCase):
+    def test_steps(self):
+        self.assertEqual(parse_path('$.data.items[0].id'), ['data', 'items', 0, 'id'])
+        self.assertEqual(parse_path('data.items[*]'), ['data', 'items', WILDCARD])
+        self.assertEqual(parse_path("$['a \"key\"'].x"), ['a "key"', 'x'])
+        self.assertEqual(parse_path('$["it\'s"].*'), ["it's", WILDCARD])
+        self.assertEqual(parse_path('$'), [])
+
+    def test_invalid(self):
+        for expression in ['$.items[-1]', '$.items[', '$..a', '$[abc]', '$.a[1', "$['open]"]:
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                parse_path(expression)
+
+class JsonPathScannerTests(SimpleTestCase):
+    PATHS = [
+        '$.data.items[1].name', '$.data.items[2]', '$.data.items[*].tags', '$.data.items[*].missing',
+        "$['a \"key\"'].x", '$.empty.*', '$.list[1][1].deep', '$.list[*][0]', '$.list[0][5]',
+        '$.number', '$.number.x', '$.*.total', '$.nope', '$',
+    ]
+
+    def test_every_chunk_size(self):
+        # Chunk borders fall inside strings, escapes, numbers and literals
+        for path in self.PATHS:
+            expected = evaluate(DOCUMENT, parse_path(path))
+            for size in range(1, 12):
+                with self.subTest(path=path, size=size):
+                    self.assertEqual(scan(DOCUMENT, path, size), expected)
+
+    def test_escaped_quotes(self):
+        document = '{"a\\"b": {"c": "x\\\\"}, "d": "\\"}"}'
+        self.assertTrue(scan(document, "$['a\"b'].c", 1))
+        self.assertTrue(scan(document, '$.d', 2))
+        self.assertFalse(scan(document, '$.c', 3))
+
+    def test_scalar_document(self):
+        self.assertTrue(scan('123', '$', 1))
+        self.assertFalse(scan('"text"', '$.a', 1))
+
+    def test_malformed(self):
+        for document in ['{"a": 1', '{"a" 1}', '[1, 2,,]', '{"a": tru}', '{"a": "open', '{"a": 1}}', '[1 2]']:
+            with self.subTest(document=document), self.assertRaises(ValueError):
+                scan(document, '$.nope', 1)
+
+class CompileScriptTests(SimpleTestCase):
+    def test_nested_if_targets(self):
+        program = compile_script('\n'.join([
+            'if element present "#a"',      # 0
+            '  click "#a"',                 # 1
+            '  if element present "#b"',    # 2
+            '    click "#b"',               # 3
+            '  end',
+            '  click "#c"',                 # 4
+            'end',
+            'assert title "Done"',          # 5
+        ]))
+        self.assertIsNone(program.error)
+        self.assertEqual([(instruction.op, instruction.target) for instruction in program.instructions],
+                         [('if', 5), ('call', None), ('if', 4), ('call', None), ('call', None), ('call', None)])
+        self.assertEqual([instruction.line for instruction in program.instructions], [1, 2, 3, 4, 6, 8])
+
+    def test_login_block(self):
+        program = compile_script('login\nfill "#u" with "a"\nend login\nassert title "Home"')
+        self.assertIsNone(program.error)
+        self.assertTrue(program.has_login)
+        self.assertEqual([(instruction.op, instruction.target) for instruction in program.instructions],
+                         [('login', 3), ('call', None), ('save_session', None), ('call', None)])
+
+    def test_syntax_errors_name_the_line(self):
+        for script, message in [
+            ('click "#a"\nend', 'Line 2: "end" without "if"'),
+            ('click "#a"\n\nif element present "#b"\nclick "#b"', 'Line 3: "if" without "end"'),
+            ('login\nfill "#u" with "a"', 'Line 1: "login" without "end login"'),
+            ('if element present "#a"\nlogin\nend login\nend', 'Line 2: only one "login" block'),
+            ('login\nif element present "#a"\nend login', 'Line 3: "end login" without "login"'),
+            ('click "#a"\nfrobnicate', 'Line 2: unknown command "frobnicate"'),
+        ]:
+            with self.subTest(script=script):
+                program = compile_script(script)
+                self.assertEqual(program.instructions, [])
+                self.assertIn(message, str(program.error))
+
+class BrowserRequested(Exception):
+    pass
+
+def no_browser(**options):
+    raise BrowserRequested()
+
+class EngineTests(SimpleTestCase):
+    def run_script(self, script, engine):
+        action = Action(id=1, sensor=Sensor(id=1, url='http://example.invalid', frequency=60), action_path='/', selenium_script=script, engine=engine)
+        with mock.patch.object(selenium_dsl, 'browser_context', no_browser), mock.patch.object(selenium_dsl, 'load_session', return_value=None):
+            return asyncio.run(DSLExecutor(action, compile_script(script)).execute())
+
+    def test_login_script_runs_in_browser_under_auto(self):
+        with self.assertRaises(BrowserRequested):
+            self.run_script('login\nfill "#u" with "a"\nend login\nassert title "Home"', 'auto')
+
+    def test_static_engine_never_opens_browser(self):
+        result = self.run_script('click "a"', 'static')
+        self.assertEqual(result.actual_value, 'fail')
+        self.assertIn('browser engine', result.body)
+
+class FakePage:
+    """A page where '#account' is only found after logging in within the same context."""
+    def __init__(self, calls):
+        self.calls     = calls
+        self.logged_in = False
+
+    async def goto(self, url, timeout=None):
+        pass
+
+    async def evaluate(self, script):
+        raise RuntimeError('no page metrics')
+
+    async def wait_for_selector(self, selector, timeout=None):
+        if selector == '#account' and not self.logged_in:
+            raise AssertionError('Element #account not found')
+
+    async def fill(self, selector, value):
+        self.calls.append(('fill', selector))
+        self.logged_in = True
+
+    def locator(self, selector):
+        return mock.Mock(count=mock.AsyncMock(return_value=1))
+
+class FakeContext:
+    def __init__(self, calls):
+        self.page = FakePage(calls)
+
+    async def add_init_script(self, script):
+        pass
+
+    async def new_page(self):
+        return self.page
+
+    async def storage_state(self):
+        return {'cookies': ['fresh']}
+
+@override_settings(BROWSER_TRACE=False)
+class SessionRetryTests(SimpleTestCase):
+    def test_expired_session_logs_in_again(self):
+        script = 'login\nfill "#u" with "a"\nend login\ncheck-element-exists "#account"'
+        action = Action(id=1, sensor=Sensor(id=1, url='http://example.invalid', frequency=60), action_path='/', selenium_script=script, engine='browser')
+        calls  = []
+
+        @contextlib.asynccontextmanager
+        async def browser_context(storage_state=None):
+            calls.append(('context', storage_state))
+            yield FakeContext(calls)
+
+        with mock.patch.object(selenium_dsl, 'browser_context', browser_context), \
+             mock.patch.object(selenium_dsl, 'load_session', return_value={'cookies': ['expired']}), \
+             mock.patch.object(selenium_dsl, 'drop_session') as drop_session, \
+             mock.patch.object(selenium_dsl, 'save_session') as save_session:
+            result = asyncio.run(DSLExecutor(action, compile_script(script)).execute())
+        self.assertEqual(result.actual_value, 'pass')
+        self.assertIsNone(result.body)
+        self.assertEqual(calls, [('context', {'cookies': ['expired']}), ('context', None), ('fill', '#u')])
+        drop_session.assert_called_once_with(1)
+        save_session.assert_called_once_with(1, {'cookies': ['fresh']})
+
+class CheckPlanTests(SimpleTestCase):
+    def plan(self, payload):
+        return CheckPlan(Action(id=1, sensor=Sensor(id=1, url='http://example.invalid', frequency=60), payload=payload))
+
+    def test_payload_string_or_object(self):
+        for payload in ['{"headers": {"X-A": "1"}, "data": {"b": 2}}', {'headers': {'X-A': '1'}, 'data': {'b': 2}}]:
+            with self.subTest(payload=payload):
+                plan = self.plan(payload)
+                self.assertIsNone(plan.error)
+                self.assertEqual((plan.headers, plan.data), ({'X-A': '1'}, {'b': 2}))
+
+    def test_bad_payload_is_the_action_error(self):
+        for payload in ['{not json', '[1]', ['headers'], 12]:
+            with self.subTest(payload=payload):
+                self.assertIsNotNone(self.plan(payload).error)
@@ -0,0 +1,34 @@
+from django.conf import settings
+
+import logging
+import os
+import shutil
+
+logger = logging.getLogger('celery_process')
+
+def trace_dir(action_id):
+    return os.path.join(settings.DATA_DIR, 'traces', str(action_id))
+
+def new_trace_path(action_id, timestamp):
+    # traces/{action}/{timestamp}.zip, open with `playwright show-trace` or trace.playwright.dev
+    os.makedirs(trace_dir(action_id), exist_ok=True)
+    return os.path.join(trace_dir(action_id), f"{timestamp.strftime('%Y%m%d%H%M%S')}.zip")
+
+def list_traces(action_id):
+    """Trace files of the action, newest first."""
+    try:
+        names = sorted((name for name in os.listdir(trace_dir(action_id)) if name.endswith('.zip')), reverse=True)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(trace_dir(action_id), name) for name in names]
+
+def rotate(action_id):
+    # Ring buffer: keep the BROWSER_TRACE_KEEP latest failures of the action
+    for path in list_traces(action_id)[settings.BROWSER_TRACE_KEEP:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def drop_traces(action_id):
+    shutil.rmtree(trace_dir(action_id), ignore_errors=True)
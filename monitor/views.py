@@ -2,6 +2,7 @@
 
 
 from .forms import UserForm, UserProfileForm
+from . import screenshots, traces
 from .models import Action, Sensor, TestResult, UserProfile, UserKey
 from .serializers import ActionSerializer, SensorSerializer, TestResultSerializer
 from .tasks import run_playwright_action
@@ -323,9 +324,16 @@ class ActionViewSet(viewsets.ModelViewSet):
             logger.error("You do not have permission to access this action's screenshots.")
             raise PermissionDenied("You do not have permission to access this action's screenshots.")
 
-        # Construct the path to the screenshot
+        # Content-addressed screenshots are indexed in the DB
+        latest = action.screenshots.order_by('-timestamp').first()
+        if latest:
+            screenshot_path = screenshots.blob_path(latest.digest, latest.extension)
+            if os.path.exists(screenshot_path):
+                return FileResponse(open(screenshot_path, 'rb'), content_type=screenshots.content_type(screenshot_path))
+
+        # Fall back to the flat files written before
         screenshot_dir              = os.path.join(settings.DATA_DIR)
-        screenshot_filename_pattern = f"{action.id}_{action.sensor.user.id}_*.jpg"
+        screenshot_filename_pattern = f"{action.id}_{action.sensor.user.id}_*.*"
         
         # Find the latest screenshot matching the pattern
         try:
@@ -338,12 +346,27 @@ class ActionViewSet(viewsets.ModelViewSet):
             screenshot_path   = os.path.join(screenshot_dir, latest_screenshot)
             
             # Return the screenshot as a binary response
-            return FileResponse(open(screenshot_path, 'rb'), content_type='image/png')
+            return FileResponse(open(screenshot_path, 'rb'), content_type=screenshots.content_type(screenshot_path))
         
         except Exception as e:
             logger.error(f"Error retrieving screenshot for action {pk}: {str(e)}")
             return Response({"error": "An error occurred while retrieving the screenshot."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    # Custom action: GET /actions/{id}/trace/
+    @swagger_auto_schema(tags=['Actions'])
+    @action(detail=True, methods=['get'])
+    def trace(self, request, pk=None):
+        action = get_object_or_404(Action, pk=pk)
+        if action.sensor.user != request.user:
+            logger.error("You do not have permission to access this action's traces.")
+            raise PermissionDenied("You do not have permission to access this action's traces.")
+
+        # Playwright trace of the latest failed run, for `playwright show-trace`
+        latest = traces.list_traces(action.id)
+        if latest:
+            return FileResponse(open(latest[0], 'rb'), as_attachment=True, filename=f"trace_{action.id}_{os.path.basename(latest[0])}", content_type='application/zip')
+        return Response({"error": "No trace found for this action."}, status=status.HTTP_404_NOT_FOUND)
+
 class TestResultViewSet(viewsets.ModelViewSet):
     authentication_classes = [APIKeyAuthentication, SessionAuthentication]
     permission_classes     = [IsAuthenticated]
@@ -373,8 +396,8 @@ class TestResultViewSet(viewsets.ModelViewSet):
             
             if action_id:
                 action = get_object_or_404(Action, id=action_id, sensor__user=self.request.user)
-                return TestResult.objects.filter(action=action, timestamp__gte=one_hour_ago)
+                return TestResult.objects.filter(action=action, timestamp__gte=one_hour_ago).prefetch_related('page_metrics')
 
-            return TestResult.objects.filter(action__sensor__user=self.request.user, timestamp__gte=one_hour_ago)
+            return TestResult.objects.filter(action__sensor__user=self.request.user, timestamp__gte=one_hour_ago).prefetch_related('page_metrics')
         else:
             return None
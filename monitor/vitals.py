@@ -0,0 +1,81 @@
+from .models import PageMetric
+
+import logging
+
+logger = logging.getLogger('celery_process')
+
+# DSL commands that may load a new page; the page is measured after each of them
+NAVIGATION_COMMANDS = {'click_element', 'double_click_element', 'click_at_coordinates'}
+
+# Runs before any page script: LCP and CLS are only reported to observers
+INIT_SCRIPT = """
+(() => {
+    const vitals = window.__djanguardVitals = {lcp: null, cls: 0, observers: []};
+    const observe = (type, callback) => {
+        try {
+            const observer = new PerformanceObserver(list => list.getEntries().forEach(callback));
+            observer.observe({type: type, buffered: true});
+            vitals.observers.push(observer);
+        } catch (e) {}
+    };
+    observe('largest-contentful-paint', entry => { vitals.lcp = entry.renderTime || entry.loadTime || entry.startTime; });
+    observe('layout-shift', entry => { if (!entry.hadRecentInput) vitals.cls += entry.value; });
+})();
+"""
+
+MEASURE_SCRIPT = """
+() => {
+    const vitals = window.__djanguardVitals;
+    if (vitals) {
+        // Deliver the entries still queued for the observer callbacks
+        vitals.observers.forEach(observer => observer.takeRecords().forEach(entry => {
+            if (entry.entryType === 'largest-contentful-paint') vitals.lcp = entry.renderTime || entry.loadTime || entry.startTime;
+            else if (!entry.hadRecentInput) vitals.cls += entry.value;
+        }));
+    }
+    const nav       = performance.getEntriesByType('navigation')[0];
+    const resources = performance.getEntriesByType('resource');
+    const positive  = value => value > 0 ? value : null;
+    return {
+        origin               : performance.timeOrigin,
+        url                  : location.href,
+        ttfb_ms              : nav ? positive(nav.responseStart) : null,
+        dom_content_loaded_ms: nav ? positive(nav.domContentLoadedEventEnd) : null,
+        load_ms              : nav ? positive(nav.loadEventEnd) : null,
+        lcp_ms               : vitals ? vitals.lcp : null,
+        cls                  : vitals ? vitals.cls : null,
+        transfer_bytes       : (nav ? nav.transferSize : 0) + resources.reduce((total, entry) => total + entry.transferSize, 0),
+        requests             : resources.length + (nav ? 1 : 0),
+    };
+}
+"""
+
+class PageMeter:
+    """
+    Reads Navigation Timing, LCP, CLS and the transferred bytes of the current page
+    after the start URL and every navigation command. A command that stays on the same
+    document (same performance.timeOrigin) is not measured again.
+    """
+    def __init__(self, block_policy='none'):
+        self.metrics      = []
+        self.origin       = None
+        self.block_policy = block_policy   # stored with the metrics, blocked requests skew them
+
+    async def install(self, context):
+        await context.add_init_script(INIT_SCRIPT)
+
+    async def measure(self, page, command='goto', line=0):
+        try:
+            values = await page.evaluate(MEASURE_SCRIPT)
+        except Exception as exc:
+            logger.error(f'Could not read page metrics: {exc}')
+            return
+        if values['origin'] == self.origin:
+            return
+        self.origin = values.pop('origin')
+        self.metrics.append(PageMetric(command=command, line=line, block_policy=self.block_policy, **values))
+
+    def save(self, test_result):
+        for metric in self.metrics:
+            metric.result = test_result
+        PageMetric.objects.bulk_create(self.metrics)
@@ -27,6 +27,10 @@ NGINX_CMD           = ['/usr/sbin/nginx']
 NGINX_CONF_TEMPLATE = '/app/config/djanguard_nginx.conf'
 NGINX_CONF_PATH     = '/etc/nginx/conf.d/default.conf'
 APP_NAME            = os.getenv('APP_NAME')
+SCHEDULER_MODE      = os.getenv('SCHEDULER_MODE', 'daemon').lower()
+CELERY_WORKERS      = [role.strip() for role in os.getenv('CELERY_WORKERS', 'http,browser,notify,maintenance').lower().split(',') if role.strip()]
+CELERY_BEAT         = os.getenv('CELERY_BEAT', 'true').lower() == 'true'  # periodic maintenance tasks: one container only
+CELERY_SCHEDULER    = os.getenv('CELERY_SCHEDULER', 'true').lower() == 'true'  # scheduler daemons share the shards through leases: any number of containers
 
 # Set up the logger
 logger = logging.getLogger('superstart')
@@ -44,7 +48,28 @@ logger.addHandler(console_handler)
 
 
 BEAT_CMD     = ['celery', '-A', APP_NAME, 'beat'  ,'--loglevel=info','--logfile=/app/logs/celery_beat.log']
-CELERY_CMD   = ['celery', '-A', APP_NAME, 'worker','--concurrency=5','--loglevel=info','--logfile=/app/logs/celery_worker.log']
+
+# One worker per queue (see CELERY_TASK_ROUTES), each overridable with CELERY_<ROLE>_POOL / CELERY_<ROLE>_CONCURRENCY.
+# http stays on prefork: a run_http_actions batch already runs its requests concurrently on the process's
+# asyncio loop, and gevent would monkey-patch that loop, the Postgres driver and the Playwright driver.
+# browser is a small prefork pool, each process has its own Chromium; prefetch 1 so a busy process
+# does not hold checks another one could run.
+WORKER_DEFAULTS = {
+    'http'       : {'pool': 'prefork', 'concurrency': 4, 'prefetch': 4},
+    'browser'    : {'pool': 'prefork', 'concurrency': 2, 'prefetch': 1},
+    'notify'     : {'pool': 'prefork', 'concurrency': 1, 'prefetch': 4},
+    'maintenance': {'pool': 'prefork', 'concurrency': 1, 'prefetch': 1},
+}
+
+def celery_worker_cmd(role):
+    defaults    = WORKER_DEFAULTS[role]
+    pool        = os.getenv(f'CELERY_{role.upper()}_POOL', defaults['pool'])
+    concurrency = os.getenv(f'CELERY_{role.upper()}_CONCURRENCY', str(defaults['concurrency']))
+    return ['celery', '-A', APP_NAME, 'worker', '-Q', role, '-n', f'{role}@%h', f'--pool={pool}', f'--concurrency={concurrency}',
+            f"--prefetch-multiplier={defaults['prefetch']}", '--loglevel=info', f'--logfile=/app/logs/celery_{role}.log']
+
+CELERY_CMDS  = {f'celery_{role}': celery_worker_cmd(role) for role in CELERY_WORKERS}
+SCHEDULER_CMD = MANAGE_PY_CMD + ['run_scheduler']
 GUNICORN_CMD = ['gunicorn','--workers', '2','--bind', '127.0.0.1:5000',f'{APP_NAME}.wsgi:application','--error-logfile', '/app/logs/gunicorn_error.log','--access-logfile', '/app/logs/gunicorn_access.log','--log-level', 'info']
 
 processes = {}
@@ -104,8 +129,12 @@ def reload_gunicorn():
 def reload_celery_processes():
     """Find all Celery worker and beat processes and send them SIGUSR1 to gracefully reload."""
     try:
-        restart_process('celery_worker', CELERY_CMD)
-        restart_process('celery_beat'  , BEAT_CMD)
+        for name, command in CELERY_CMDS.items():
+            restart_process(name, command)
+        if CELERY_BEAT:
+            restart_process('celery_beat', BEAT_CMD)
+        if CELERY_SCHEDULER and SCHEDULER_MODE == 'daemon':
+            restart_process('scheduler', SCHEDULER_CMD)
     except Exception as e:
         logger.error(f"Error sending signal to Celery processes: {e}")
 
@@ -152,8 +181,12 @@ def setup_django_services():
 
 def setup_celery_services():
     """Setup services for the Celery role."""
-    start_process('celery_worker', CELERY_CMD)
-    start_process('celery_beat'  , BEAT_CMD)
+    for name, command in CELERY_CMDS.items():
+        start_process(name, command)
+    if CELERY_BEAT:
+        start_process('celery_beat', BEAT_CMD)
+    if CELERY_SCHEDULER and SCHEDULER_MODE == 'daemon':
+        start_process('scheduler', SCHEDULER_CMD)
 
 def start_watchdog():
     """Start watchdog to monitor file changes."""